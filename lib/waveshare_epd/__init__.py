@@ -0,0 +1,203 @@
+# *****************************************************************************
+# * | File        :	  __init__.py
+# * | Function    :   Registry of the e-paper panel drivers
+# * | Info        :
+# *----------------
+# * | Info        :   Lists every driver module with its resolution and
+# * |                 colours without importing it. Importing a driver
+# * |                 imports epdconfig, which probes the platform and
+# * |                 opens GPIO, so that only happens on first real use.
+# -----------------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import importlib
+from collections import namedtuple
+
+# Colours each panel family can show
+BW          = ('black', 'white')
+BWR         = ('black', 'white', 'red')
+BWY         = ('black', 'white', 'yellow')
+FOUR_COLOR  = ('black', 'white', 'yellow', 'red')
+SIX_COLOR   = ('black', 'white', 'yellow', 'red', 'blue', 'green')
+SEVEN_COLOR = ('black', 'white', 'green', 'blue', 'red', 'yellow', 'orange')
+
+# width/height are the driver's EPD_WIDTH/EPD_HEIGHT; gray4 is True when
+# the driver has getbuffer_4Gray/display_4Gray
+PanelInfo = namedtuple('PanelInfo', ['width', 'height', 'colors', 'gray4'])
+PanelInfo.__new__.__defaults__ = (False,)
+
+PANELS = {
+    'epd13in3b':         PanelInfo(960, 680, BWR),
+    'epd13in3k':         PanelInfo(960, 680, BW, True),
+    'epd1in02':          PanelInfo(80, 128, BW),
+    'epd1in54':          PanelInfo(200, 200, BW),
+    'epd1in54_V2':       PanelInfo(200, 200, BW),
+    'epd1in54b':         PanelInfo(200, 200, BWR),
+    'epd1in54b_V2':      PanelInfo(200, 200, BWR),
+    'epd1in54c':         PanelInfo(152, 152, BWY),
+    'epd1in64g':         PanelInfo(168, 168, FOUR_COLOR),
+    'epd2in13':          PanelInfo(122, 250, BW),
+    'epd2in13_V2':       PanelInfo(122, 250, BW),
+    'epd2in13_V3':       PanelInfo(122, 250, BW),
+    'epd2in13_V4':       PanelInfo(122, 250, BW),
+    'epd2in13b_V3':      PanelInfo(104, 212, BWR),
+    'epd2in13b_V4':      PanelInfo(122, 250, BWR),
+    'epd2in13bc':        PanelInfo(104, 212, BWR),
+    'epd2in13d':         PanelInfo(104, 212, BW),
+    'epd2in13g':         PanelInfo(122, 250, FOUR_COLOR),
+    'epd2in15b':         PanelInfo(160, 296, BWR),
+    'epd2in15g':         PanelInfo(160, 296, FOUR_COLOR),
+    'epd2in36g':         PanelInfo(168, 296, FOUR_COLOR),
+    'epd2in66':          PanelInfo(152, 296, BW),
+    'epd2in66b':         PanelInfo(152, 296, BWR),
+    'epd2in66g':         PanelInfo(184, 360, FOUR_COLOR),
+    'epd2in7':           PanelInfo(176, 264, BW, True),
+    'epd2in7_V2':        PanelInfo(176, 264, BW, True),
+    'epd2in7b':          PanelInfo(176, 264, BWR),
+    'epd2in7b_V2':       PanelInfo(176, 264, BWR),
+    'epd2in9':           PanelInfo(128, 296, BW),
+    'epd2in9_V2':        PanelInfo(128, 296, BW, True),
+    'epd2in9b_V3':       PanelInfo(128, 296, BWR),
+    'epd2in9b_V4':       PanelInfo(128, 296, BWR),
+    'epd2in9bc':         PanelInfo(128, 296, BWR),
+    'epd2in9d':          PanelInfo(128, 296, BW),
+    'epd3in0g':          PanelInfo(168, 400, FOUR_COLOR),
+    'epd3in52':          PanelInfo(240, 360, BW),
+    'epd3in7':           PanelInfo(280, 480, BW, True),
+    'epd4in01f':         PanelInfo(640, 400, SEVEN_COLOR),
+    'epd4in2':           PanelInfo(400, 300, BW, True),
+    'epd4in26':          PanelInfo(800, 480, BW, True),
+    'epd4in2_V2':        PanelInfo(400, 300, BW, True),
+    'epd4in2b_V2':       PanelInfo(400, 300, BWR),
+    'epd4in2b_V2_old':   PanelInfo(400, 300, BWR),
+    'epd4in2bc':         PanelInfo(400, 300, BWR),
+    'epd4in37g':         PanelInfo(512, 368, FOUR_COLOR),
+    'epd5in65f':         PanelInfo(600, 448, SEVEN_COLOR),
+    'epd5in79':          PanelInfo(792, 272, BW, True),
+    'epd5in79b':         PanelInfo(792, 272, BWR),
+    'epd5in79g':         PanelInfo(792, 272, FOUR_COLOR),
+    'epd5in83':          PanelInfo(600, 448, BW),
+    'epd5in83_V2':       PanelInfo(648, 480, BW),
+    'epd5in83b_V2':      PanelInfo(648, 480, BWR),
+    'epd5in83bc':        PanelInfo(600, 448, BWR),
+    'epd7in3e':          PanelInfo(800, 480, SIX_COLOR),
+    'epd7in3f':          PanelInfo(800, 480, SEVEN_COLOR),
+    'epd7in3g':          PanelInfo(800, 480, FOUR_COLOR),
+    'epd7in5':           PanelInfo(640, 384, BW),
+    'epd7in5_HD':        PanelInfo(880, 528, BW),
+    'epd7in5_V2':        PanelInfo(800, 480, BW, True),
+    'epd7in5_V2_old':    PanelInfo(800, 480, BW),
+    'epd7in5b_HD':       PanelInfo(880, 528, BWR),
+    'epd7in5b_V2':       PanelInfo(800, 480, BWR),
+    'epd7in5b_V2_old':   PanelInfo(800, 480, BWR),
+    'epd7in5bc':         PanelInfo(640, 384, BWR),
+}
+
+
+# Drivers that weather.py can't drive with init(), display(image), Clear()
+# and sleep() for a full black and white refresh: {name: {step: (method,
+# args)}}. A string argument names an attribute of the EPD object.
+FULL_REFRESH = {
+    'epd1in02':    {'init': ('Init', ()), 'sleep': ('Sleep', ())},
+    'epd1in54':    {'init': ('init', ('lut_full_update',))},
+    'epd1in54_V2': {'init': ('init', (False,))},
+    'epd2in13':    {'init': ('init', ('lut_full_update',))},
+    'epd2in13_V2': {'init': ('init', ('FULL_UPDATE',))},
+    'epd2in66':    {'init': ('init', (0,))},
+    'epd2in9':     {'init': ('init', ('lut_full_update',))},
+    'epd3in7':     {'init': ('init', (1,)), 'display': ('display_1Gray', ()), 'Clear': ('Clear', (0xFF, 1))},
+}
+
+
+def panel_info(name):
+    if name not in PANELS:
+        raise ValueError("Unknown e-Paper driver: %s" % name)
+    return PANELS[name]
+
+
+def load_driver(name):
+    # Import and return the driver module (this imports epdconfig too)
+    panel_info(name)
+    return importlib.import_module('.' + name, __name__)
+
+
+class LazyEPD:
+    # Stands in for a driver's EPD instance. width/height come from the
+    # registry; the driver module, epdconfig and the EPD object are only
+    # created when anything else is accessed (init, getbuffer, display...).
+    def __init__(self, name):
+        info = panel_info(name)
+        self.name = name
+        self.width = info.width
+        self.height = info.height
+        self.colors = info.colors
+        self.epd = None
+        self.blank = None
+
+    def driver(self):
+        if self.epd is None:
+            self.epd = load_driver(self.name).EPD()
+        return self.epd
+
+    # The same full refresh on every panel: init_full(), clear(),
+    # display_full(frame) with a frame from getbuffer() and sleep(). B/W/R
+    # and B/W/Y panels get a blank red/yellow plane. Only B/W panels with
+    # init_part() and display_Partial() refresh partially.
+    def call(self, step, *args):
+        epd = self.driver()
+        method, extra = FULL_REFRESH.get(self.name, {}).get(step, (step, ()))
+        extra = [getattr(epd, arg) if isinstance(arg, str) else arg for arg in extra]
+        return getattr(epd, method)(*(args + tuple(extra)))
+
+    def init_full(self):
+        return self.call('init')
+
+    def clear(self):
+        return self.call('Clear')
+
+    def display_full(self, frame):
+        if self.colors in (BWR, BWY):
+            return self.call('display', frame, self.blank_plane())
+        return self.call('display', frame)
+
+    def sleep(self):
+        return self.call('sleep')
+
+    def blank_plane(self):
+        if self.blank is None:
+            from PIL import Image
+
+            self.blank = self.driver().getbuffer(Image.new('1', (self.width, self.height), 255))
+        return self.blank
+
+    @property
+    def partial_refresh(self):
+        return (self.colors == BW and hasattr(self.driver(), 'init_part')
+                and hasattr(self.driver(), 'display_Partial'))
+
+    def __getattr__(self, attr):
+        # only called for attributes not set in __init__
+        if attr == 'epd':
+            raise AttributeError(attr)
+        return getattr(self.driver(), attr)
+
+
+def get_epd(name):
+    return LazyEPD(name)
@@ -29,6 +29,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbase
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 400
@@ -36,28 +38,16 @@ EPD_HEIGHT      = 300
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(epdbase.UC81xx):
+    WIDTH = EPD_WIDTH
+    HEIGHT = EPD_HEIGHT
+    RESET_MS = (200, 5, 200)
+
     def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
-        self.width = EPD_WIDTH
-        self.height = EPD_HEIGHT
+        epdbase.UC81xx.__init__(self)
         self.flag = 0
-        
         if (epdconfig.module_init(cleanup=True) != 0):
             return -1
-        
-
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
 
     def send_command(self, command):
         epdconfig.digital_write(self.dc_pin, 0)
@@ -71,22 +61,13 @@ class EPD:
         epdconfig.DEV_SPI_write(data)
         epdconfig.digital_write(self.cs_pin, 1)
 
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
     def ReadBusy(self):
         logger.debug("e-Paper busy")
         if(self.flag == 1):
-            while(epdconfig.digital_read(self.busy_pin) == 1): 
-                epdconfig.delay_ms(100) 
+            epdconfig.wait_for_busy(0)
         
         else:
-            while(epdconfig.digital_read(self.busy_pin) == 0): 
-                epdconfig.delay_ms(100) 
+            epdconfig.wait_for_busy(1)
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
@@ -154,30 +135,6 @@ class EPD:
         
         return 0
 
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
     def display(self, imageblack, imagered):
         high = self.height
         if( self.width % 8 == 0) :
@@ -187,25 +144,17 @@ class EPD:
         
         if(self.flag == 1):
             self.send_command(0x24)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(imageblack[i + j * wide]) 
+            self.send_data2(imageblack)
                     
             self.send_command(0x26)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(~imagered[i + j * wide]) 
+            self.send_data2(epdbuffer.invert(imagered))
         
         else:
             self.send_command(0x10)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(imageblack[i + j * wide]) 
+            self.send_data2(imageblack)
                     
             self.send_command(0x13)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(~imagered[i + j * wide]) 
+            self.send_data2(epdbuffer.invert(imagered))
 
         self.TurnOnDisplay()
         
@@ -218,25 +167,17 @@ class EPD:
 
         if(self.flag == 1):
             self.send_command(0x24)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(0xff) 
+            self.send_data2([0xff] * (wide * high))
                     
             self.send_command(0x26)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(0x00) 
+            self.send_data2([0x00] * (wide * high))
         
         else:
             self.send_command(0x10)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(0xff) 
+            self.send_data2([0xff] * (wide * high))
                     
             self.send_command(0x13)
-            for j in range(0, high):
-                for i in range(0, wide):
-                    self.send_data(0x00) 
+            self.send_data2([0x00] * (wide * high))
 
         self.TurnOnDisplay()
 
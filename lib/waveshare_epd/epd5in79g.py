@@ -30,10 +30,8 @@
 
 import logging
 from . import epdconfig
-
-import PIL
-from PIL import Image
-import io
+from . import epdbase
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 792
@@ -41,60 +39,17 @@ EPD_HEIGHT      = 272
 
 logger = logging.getLogger(__name__)
 
-class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
-        self.width = EPD_WIDTH
-        self.height = EPD_HEIGHT
-        self.BLACK  = 0x000000   #   00  BGR
-        self.WHITE  = 0xffffff   #   01
-        self.YELLOW = 0x00ffff   #   10
-        self.RED    = 0x0000ff   #   11
-
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
+class EPD(epdbase.FourColor):
+    WIDTH = EPD_WIDTH
+    HEIGHT = EPD_HEIGHT
+    RESET_MS = (200, 1, 200)
+
     def ReadBusyH(self):
         logger.debug("e-Paper busy H")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(5)
+        epdconfig.wait_for_busy(1)      # 0: idle, 1: busy
         epdconfig.delay_ms(200)
         logger.debug("e-Paper busy H release")
 
-    def ReadBusyL(self):
-        logger.debug("e-Paper busy L")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: busy, 1: idle
-            epdconfig.delay_ms(5)
-        logger.debug("e-Paper busy L release")
-
     def TurnOnDisplay(self):
         self.send_command(0xA2)
         self.send_data(0x00)        
@@ -156,50 +111,24 @@ class EPD:
         self.ReadBusyH()	
         return 0
 
-    def getbuffer(self, image):
-        # Create a pallette with the 4 colors supported by the panel
-        pal_image = Image.new("P", (1,1))
-        pal_image.putpalette( (0,0,0,  255,255,255,  255,255,0,   255,0,0) + (0,0,0)*252)
-
-        # Check if we need to rotate the image
-        imwidth, imheight = image.size
-        if(imwidth == self.width and imheight == self.height):
-            image_temp = image
-        elif(imwidth == self.height and imheight == self.width):
-            image_temp = image.rotate(90, expand=True)
-        else:
-            logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
-
-        # Convert the soruce image to the 4 colors, dithering if needed
-        image_4color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_4color = bytearray(image_4color.tobytes('raw'))
-
-        # into a single byte to transfer to the panel
-        buf = [0x00] * int(self.width * self.height / 4)
-        idx = 0
-        for i in range(0, len(buf_4color), 4):
-            buf[idx] = (buf_4color[i] << 6) + (buf_4color[i+1] << 4) + (buf_4color[i+2] << 2) + buf_4color[i+3]
-            idx += 1
-        return buf
-
     def display(self, image):
         Width =int(self.width / 8)
         Width1 =int(self.width / 4)
         Height = self.height
 
+        # Each controller gets its half of the rows, taken alternately from
+        # the top and the bottom of the panel
+        order = [row for i in range(Height//2) for row in (i, Height-i-1)]
+
         self.send_command(0xA2)
         self.send_data(0x02)
         self.send_command(0x10)
-        for i in range(Height//2):
-            self.send_data2(image[i * Width1 : i * Width1+Width])
-            self.send_data2(image[(Height-i-1) * Width1 : (Height-i-1) * Width1+Width])
+        self.send_data2(epdbuffer.rows(epdbuffer.columns(image, Width1, 0, Width), Width, order))
 
         self.send_command(0xA2)
         self.send_data(0x01)
         self.send_command(0x10)
-        for i in range(Height//2):
-            self.send_data2(image[i * Width1+Width : (i+1) * Width1])
-            self.send_data2(image[(Height-i-1) * Width1+Width : (Height-i) * Width1])
+        self.send_data2(epdbuffer.rows(epdbuffer.columns(image, Width1, Width, Width1), Width, order))
 
         self.TurnOnDisplay()
 
@@ -207,12 +136,12 @@ class EPD:
         self.send_command(0xA2)
         self.send_data(0x02)
         self.send_command(0x10)
-        self.send_data2([color] * int(self.height) * int(self.width/8))
+        self.send_data2(bytes([color]) * (int(self.height) * int(self.width/8)))
 
         self.send_command(0xA2)
         self.send_data(0x01)
         self.send_command(0x10)
-        self.send_data2([color] * int(self.height) * int(self.width/8))
+        self.send_data2(bytes([color]) * (int(self.height) * int(self.width/8)))
 
         self.TurnOnDisplay()
 
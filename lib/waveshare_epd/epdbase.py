@@ -0,0 +1,182 @@
+# *****************************************************************************
+# * | File        :	  epdbase.py
+# * | Function    :   What the EPD drivers have in common
+# * | Info        :
+# *----------------
+# * | Info        :   Pins, hardware reset, command/data transfers, BUSY
+# * |                 waits and frame packing, once for every driver. A
+# * |                 driver subclasses the class of its controller family,
+# * |                 sets its geometry and timings as class attributes and
+# * |                 adds its init sequences, LUTs and display methods.
+# -----------------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import logging
+
+from . import epdconfig
+from . import epdbuffer
+
+logger = logging.getLogger(__name__)
+
+
+class EPDBase:
+    # Panel resolution in pixels
+    WIDTH = 0
+    HEIGHT = 0
+    # Hardware reset: RST high for RESET_MS[0] ms, then RESET_PULSES times
+    # low for RESET_MS[1] ms and high again for RESET_MS[2] ms
+    RESET_MS = (200, 2, 200)
+    RESET_PULSES = 1
+    # ReadBusy(): the command sent first (0x71 "get status" on some UC81xx),
+    # or only when the controller is still busy (BUSY_POLL_COMMAND, for the
+    # drivers that polled with it), the level of the BUSY pin once the
+    # controller is idle, and how long to wait after that
+    BUSY_COMMAND = None
+    BUSY_POLL_COMMAND = None
+    BUSY_IDLE = 1
+    BUSY_DELAY_MS = 0
+
+    def __init__(self):
+        self.reset_pin = epdconfig.RST_PIN
+        self.dc_pin = epdconfig.DC_PIN
+        self.busy_pin = epdconfig.BUSY_PIN
+        self.cs_pin = epdconfig.CS_PIN
+        self.width = self.WIDTH
+        self.height = self.HEIGHT
+        self.select_busy_idle()
+
+    # Tell a backend without a real BUSY pin (the simulated one) which level
+    # this panel's controller idles at
+    def select_busy_idle(self):
+        if hasattr(epdconfig, 'set_busy_idle'):
+            epdconfig.set_busy_idle(self.BUSY_IDLE)
+
+    # Hardware reset
+    def reset(self):
+        self.select_busy_idle()
+        high, low, settle = self.RESET_MS
+        epdconfig.digital_write(self.reset_pin, 1)
+        epdconfig.delay_ms(high)
+        for _ in range(self.RESET_PULSES):
+            epdconfig.digital_write(self.reset_pin, 0)
+            epdconfig.delay_ms(low)
+            epdconfig.digital_write(self.reset_pin, 1)
+            epdconfig.delay_ms(settle)
+
+    def send_command(self, command):
+        epdconfig.digital_write(self.dc_pin, 0)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte([command])
+        epdconfig.digital_write(self.cs_pin, 1)
+
+    def send_data(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte([data])
+        epdconfig.digital_write(self.cs_pin, 1)
+
+    # send a lot of data: one DC/CS toggle per SPI_MAX_TRANSFER bytes
+    def send_data2(self, data):
+        epdconfig.spi_writebuffer(data)
+
+    # Sleeps on the BUSY pin's edge instead of polling it
+    def ReadBusy(self):
+        logger.debug("e-Paper busy")
+        if self.BUSY_COMMAND is not None:
+            self.send_command(self.BUSY_COMMAND)
+        elif self.BUSY_POLL_COMMAND is not None and epdconfig.digital_read(self.busy_pin) != self.BUSY_IDLE:
+            self.send_command(self.BUSY_POLL_COMMAND)
+        epdconfig.wait_for_busy(self.BUSY_IDLE)
+        if self.BUSY_DELAY_MS:
+            epdconfig.delay_ms(self.BUSY_DELAY_MS)
+        logger.debug("e-Paper busy release")
+
+    # Controllers that signal with both levels during one refresh
+    def ReadBusyH(self):
+        logger.debug("e-Paper busy H")
+        epdconfig.wait_for_busy(1)
+        logger.debug("e-Paper busy H release")
+
+    def ReadBusyL(self):
+        logger.debug("e-Paper busy L")
+        epdconfig.wait_for_busy(0)
+        logger.debug("e-Paper busy L release")
+
+    # 1 bit per pixel, 0=black, as the black/white RAM takes it; a portrait
+    # image is rotated onto the panel
+    def getbuffer(self, image):
+        return epdbuffer.pack_plane(image, self.width, self.height)
+
+
+class UC81xx(EPDBase):
+    # UC81xx/IL0373 class: BUSY is low while the controller works
+    BUSY_IDLE = 1
+
+
+class SSD16xx(EPDBase):
+    # SSD16xx/IL3820 class: BUSY is high while the controller works
+    BUSY_IDLE = 0
+
+
+class DualController(SSD16xx):
+    # Two SSD16xx controllers side by side, the left half of every row in
+    # the master's RAM (0x24/0x26) and the right half in the slave's
+    # (0xA4/0xA6). The halves overlap by one byte in the middle.
+    def halves(self, buf):
+        # (left, right) columns of a packed frame, each sent in one go
+        stride = epdbuffer.row_bytes(self.width)
+        half = self.width // 16 + 1
+        return (epdbuffer.columns(buf, stride, 0, half),
+                epdbuffer.columns(buf, stride, half - 1, 2 * half - 1))
+
+
+class ACeP(UC81xx):
+    # 7-colour panels: 4 bits per pixel, the colour codes in COLORS order
+    COLORS = epdbuffer.ACEP_COLORS
+    # Map onto the palette without dithering where the image only has
+    # palette colours
+    EXACT = False
+    BLACK = 0x000000
+    WHITE = 0xffffff
+    GREEN = 0x00ff00
+    BLUE = 0xff0000
+    RED = 0x0000ff
+    YELLOW = 0x00ffff
+    ORANGE = 0x0080ff
+
+    def ReadBusyHigh(self):
+        self.ReadBusyH()
+
+    def ReadBusyLow(self):
+        self.ReadBusyL()
+
+    def getbuffer(self, image, dither=epdbuffer.DITHER_FLOYD_STEINBERG):
+        return epdbuffer.pack_colors(image, self.width, self.height, self.COLORS, dither, self.EXACT)
+
+
+class FourColor(UC81xx):
+    # Black/white/yellow/red "g" panels: 2 bits per pixel
+    BLACK = 0x000000
+    WHITE = 0xffffff
+    YELLOW = 0x00ffff
+    RED = 0x0000ff
+
+    def getbuffer(self, image, dither=epdbuffer.DITHER_FLOYD_STEINBERG):
+        return epdbuffer.pack_4color(image, self.width, self.height, dither=dither)
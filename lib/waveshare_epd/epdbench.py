@@ -0,0 +1,260 @@
+# *****************************************************************************
+# * | File        :	  epdbench.py
+# * | Function    :   Time frame conversion and SPI transfer of the drivers
+# * | Info        :
+# *----------------
+# * | Info        :   Runs on epdconfig's SimulatedBackend
+# * |                 (EPD_BACKEND=simulated). For each driver it times
+# * |                 getbuffer() and display() on the host and counts the
+# * |                 bytes display() puts on the wire, from which the SPI
+# * |                 time at the HAT's clock follows. With --packing it
+# * |                 times the 7-colour drivers' getbuffer() against the
+# * |                 per-pixel packing they used before epdbuffer.
+# * |                 With --memory it measures the drivers' memory with
+# * |                 tracemalloc.
+# -----------------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import sys
+import time
+import logging
+import collections
+import tracemalloc
+
+from . import BW, PANELS, get_epd
+
+logger = logging.getLogger(__name__)
+
+# SPI clock set by epdconfig.module_init() on the Raspberry Pi and Jetson
+SPI_HZ = 4000000
+
+
+def test_image(width, height, colors):
+    # Colour bars over a gray ramp: flat areas in every panel colour plus
+    # shades that make the dithering work
+    from PIL import Image, ImageColor, ImageDraw
+
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    bar = width / len(colors)
+    for i, color in enumerate(colors):
+        draw.rectangle([int(i * bar), 0, int((i + 1) * bar) - 1, height // 3], fill=ImageColor.getrgb(color))
+    return image
+
+
+class WireCounter:
+    # Counts the command and data bytes traced while it is attached, and
+    # the number of SPI writes they took
+    def __init__(self, backend):
+        self.backend = backend
+        self.bytes = self.writes = 0
+
+    def __call__(self, t, kind, data):
+        if kind in ('command', 'data'):
+            self.bytes += len(data)
+            self.writes += 1
+
+    def __enter__(self):
+        self.backend.add_listener(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.backend.remove_listener(self)
+
+
+def best_time(function, repeat):
+    # Fastest of `repeat` runs in ms, and the last result
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = (time.perf_counter() - started) * 1000.0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def measure(name, image=None, repeat=3, **options):
+    # Time getbuffer(image, **options) and display_full() of driver `name`
+    # (a blank second plane on B/W/R panels).
+    # Returns a dict with convert_ms, display_ms (host time), bytes and
+    # writes (on the wire per display) and spi_ms (those bytes at SPI_HZ).
+    from . import epdconfig
+
+    backend = epdconfig.implementation
+    if not isinstance(backend, epdconfig.SimulatedBackend):
+        raise RuntimeError("epdbench needs EPD_BACKEND=simulated")
+    epd = get_epd(name)
+    if image is None:
+        image = test_image(epd.width, epd.height, PANELS[name].colors)
+    convert_ms, buf = best_time(lambda: epd.getbuffer(image, **options), repeat)
+
+    def display():
+        with WireCounter(backend) as counter:
+            epd.display_full(buf)
+        return counter.bytes, counter.writes
+
+    display_ms, (count, writes) = best_time(display, repeat)
+    return {'name': name, 'convert_ms': convert_ms, 'display_ms': display_ms,
+            'bytes': count, 'writes': writes, 'spi_ms': count * 8 * 1000.0 / SPI_HZ}
+
+
+def legacy_pack_quantized(image, width, height, colors):
+    # The drivers' packing before epdbuffer.pack_colors(): quantize to the
+    # palette, then a Python loop over pixel pairs into a list
+    from PIL import Image
+
+    pal_image = Image.new("P", (1,1))
+    pal_image.putpalette(sum(colors, ()) + (0,0,0)*(256 - len(colors)))
+    buf_7color = bytearray(image.convert("RGB").quantize(palette=pal_image).tobytes('raw'))
+    buf = [0x00] * int(width * height / 2)
+    idx = 0
+    for i in range(0, len(buf_7color), 2):
+        buf[idx] = (buf_7color[i] << 4) + buf_7color[i+1]
+        idx += 1
+    return buf
+
+
+def legacy_pack_exact(image, width, height, colors):
+    # epd4in01f's packing before epdbuffer: each pixel compared with every
+    # palette colour, code 0 without an exact match
+    buf = [0x00] * int(width * height / 2)
+    pixels = image.convert('RGB').load()
+    for y in range(height):
+        for x in range(width):
+            Add = int((x + y * width) / 2)
+            Color = colors.index(pixels[x, y]) if pixels[x, y] in colors else 0
+            data_t = buf[Add]&(~(0xF0 >> ((x % 2)*4)))
+            buf[Add] = data_t | ((Color << 4) >> ((x % 2)*4))
+    return buf
+
+
+def measure_packing(name, image=None, repeat=3):
+    # Time the legacy packing and getbuffer() of 7-colour driver `name` on
+    # a landscape image. Returns a dict with old_ms, new_ms and same
+    # (whether both gave the same bytes).
+    from . import epdbase
+
+    epd = get_epd(name)
+    driver = epd.driver()
+    if not isinstance(driver, epdbase.ACeP):
+        raise ValueError("%s is not a 7-colour panel" % name)
+    if image is None:
+        image = test_image(epd.width, epd.height, PANELS[name].colors)
+    legacy = legacy_pack_exact if driver.EXACT else legacy_pack_quantized
+    old_ms, old = best_time(lambda: legacy(image, epd.width, epd.height, driver.COLORS), repeat)
+    new_ms, new = best_time(lambda: epd.getbuffer(image), repeat)
+    return {'name': name, 'old_ms': old_ms, 'new_ms': new_ms, 'same': bytes(old) == bytes(new)}
+
+
+def measure_memory(name, image=None):
+    # tracemalloc of driver `name`: KB kept by loading it (driver_kb), and
+    # the peak KB allocated while getbuffer(image) (convert_kb) and
+    # display_full() (display_kb) run, next to the frame's size (frame_kb).
+    # B/W panels get a mode '1' image, as weather.py renders them. The
+    # simulated backend keeps no trace meanwhile, so only the driver's own
+    # copies count.
+    from . import epdconfig
+
+    backend = epdconfig.implementation
+    if not isinstance(backend, epdconfig.SimulatedBackend):
+        raise RuntimeError("epdbench needs EPD_BACKEND=simulated")
+    epd = get_epd(name)
+    if image is None:
+        image = test_image(epd.width, epd.height, PANELS[name].colors)
+        if PANELS[name].colors == BW:
+            image = image.convert('1')
+    trace = backend.trace
+    backend.trace = collections.deque(maxlen=0)
+    tracemalloc.start()
+    try:
+        started = tracemalloc.get_traced_memory()[0]
+        epd.driver()
+        driver = tracemalloc.get_traced_memory()[0] - started
+        tracemalloc.reset_peak()
+        started = tracemalloc.get_traced_memory()[0]
+        buf = epd.getbuffer(image)
+        convert = tracemalloc.get_traced_memory()[1] - started
+        tracemalloc.reset_peak()
+        started = tracemalloc.get_traced_memory()[0]
+        epd.display_full(buf)
+        display = tracemalloc.get_traced_memory()[1] - started
+    finally:
+        tracemalloc.stop()
+        backend.trace = trace
+    return {'name': name, 'driver_kb': driver / 1024.0, 'convert_kb': convert / 1024.0,
+            'display_kb': display / 1024.0, 'frame_kb': len(bytes(buf)) / 1024.0}
+
+
+def run(names, repeat=3, **options):
+    results = []
+    for name in names:
+        try:
+            results.append(measure(name, repeat=repeat, **options))
+        except Exception as e:
+            logger.warning("%s: %s", name, e)
+    return results
+
+
+def run_memory(names):
+    results = []
+    for name in names:
+        try:
+            results.append(measure_memory(name))
+        except Exception as e:
+            logger.warning("%s: %s", name, e)
+    return results
+
+
+def run_packing(names, repeat=3):
+    results = []
+    for name in names:
+        try:
+            results.append(measure_packing(name, repeat=repeat))
+        except Exception as e:
+            logger.warning("%s: %s", name, e)
+    return results
+
+
+def main(argv):
+    # python -m waveshare_epd.epdbench epd4in37g epd7in3g ...
+    # python -m waveshare_epd.epdbench --packing [epd7in3f ...]
+    # python -m waveshare_epd.epdbench --memory [epd7in5_V2 ...]
+    logging.basicConfig(level=logging.WARNING)
+    if argv[:1] == ['--memory']:
+        print("%-16s %10s %10s %10s %10s" % ('driver', 'driver KB', 'frame KB', 'convert KB', 'display KB'))
+        for result in run_memory(argv[1:] or sorted(PANELS)):
+            print("%(name)-16s %(driver_kb)10.1f %(frame_kb)10.1f %(convert_kb)10.1f %(display_kb)10.1f" % result)
+        return
+    if argv[:1] == ['--packing']:
+        from . import SEVEN_COLOR, SIX_COLOR
+
+        print("%-16s %12s %12s %8s %6s" % ('driver', 'old ms', 'new ms', 'speedup', 'same'))
+        for result in run_packing(argv[1:] or sorted(name for name in PANELS if PANELS[name].colors in (SIX_COLOR, SEVEN_COLOR))):
+            print("%-16s %12.1f %12.1f %7.1fx %6s" % (result['name'], result['old_ms'], result['new_ms'],
+                                                       result['old_ms'] / result['new_ms'],
+                                                       'yes' if result['same'] else 'NO'))
+        return
+    print("%-16s %12s %12s %10s %8s %10s" % ('driver', 'convert ms', 'display ms', 'bytes', 'writes', 'SPI ms'))
+    for result in run(argv or sorted(PANELS)):
+        print("%(name)-16s %(convert_ms)12.1f %(display_ms)12.1f %(bytes)10d %(writes)8d %(spi_ms)10.1f" % result)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
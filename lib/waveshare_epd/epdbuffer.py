@@ -0,0 +1,379 @@
+# *****************************************************************************
+# * | File        :	  epdbuffer.py
+# * | Function    :   Shared framebuffer packing for the e-paper drivers
+# * | Info        :
+# *----------------
+# * | Info        :   NumPy is used when it is installed, otherwise the
+# * |                 packing falls back to bytes.translate / int arithmetic,
+# * |                 which also run at C speed.
+# -----------------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+# bytes.translate table mapping every byte to its complement (b ^ 0xFF)
+INVERT_TABLE = bytes(range(0xFF, -1, -1))
+
+
+def row_bytes(width):
+    return (width + 7) // 8
+
+
+def fit_image(image, width, height, mode):
+    # Convert the image to the panel mode, rotating portrait images onto a
+    # landscape panel (and vice versa). Returns None on a size mismatch.
+    # The packers only read the image, so one already in `mode` is used
+    # as it is instead of being copied.
+    imwidth, imheight = image.size
+    if(imwidth == width and imheight == height):
+        return image if image.mode == mode else image.convert(mode)
+    elif(imwidth == height and imheight == width):
+        # image has correct dimensions, but needs to be rotated
+        image = image.rotate(90, expand=True)
+        return image if image.mode == mode else image.convert(mode)
+    logger.warning("Wrong image dimensions: must be " + str(width) + "x" + str(height))
+    return None
+
+
+def invert(buf, out=None):
+    # Complement every byte of a packed buffer in one C-level pass. With
+    # `out` (a writable buffer of the same size, e.g. a bytearray a driver
+    # keeps for every frame) the result is written there instead of into a
+    # new buffer.
+    if isinstance(buf, list):
+        buf = bytes(buf)
+    if out is not None:
+        if numpy is not None:
+            numpy.invert(numpy.frombuffer(buf, dtype=numpy.uint8),
+                         out=numpy.frombuffer(out, dtype=numpy.uint8))
+        else:
+            out[:] = bytes(buf).translate(INVERT_TABLE)
+        return memoryview(out)
+    if numpy is not None:
+        return memoryview(numpy.invert(numpy.frombuffer(buf, dtype=numpy.uint8)))
+    return bytes(buf).translate(INVERT_TABLE)
+
+
+def pack_plane(image, width, height, pad_white=False):
+    # 1 bit per pixel, 0=black: PIL's own '1' bytes, what SSD16xx black/white
+    # RAM takes as it is. White on a size mismatch. PIL pads the last byte of
+    # a row with 0 bits; with `pad_white` they are 1 instead.
+    img = fit_image(image, width, height, '1')
+    if img is None:
+        return bytes(row_bytes(width) * height).translate(INVERT_TABLE)
+    if pad_white and width % 8:
+        from PIL import Image
+
+        padded = Image.new('1', (row_bytes(width) * 8, height), 1)
+        padded.paste(img, (0, 0))
+        img = padded
+    return img.tobytes('raw')
+
+
+def mono_codes(image, width, height, white):
+    # One byte per pixel of the image converted to '1': `white` where it is
+    # white, 0 where it is black, for the drivers that send more than one
+    # bit per pixel. None on a size mismatch.
+    img = fit_image(image, width, height, '1')
+    if img is None:
+        return None
+    return img.convert('L').tobytes().translate(bytes(white if p else 0 for p in range(256)))
+
+
+def pack_planes(image, width, height):
+    # Pack a PIL image into the two 1bpp RAM planes used by the controllers.
+    # Returns (old, new): `old` is the raw PIL plane (0=black) that goes to the
+    # OLD/"DTM1" RAM and `new` is its complement (1=black) for the NEW RAM.
+    old = pack_plane(image, width, height)
+    return old, invert(old)
+
+
+def pack(image, width, height):
+    # The buffer returned by getbuffer(): 1 bit per pixel, 1=black. PIL's
+    # raw encoder packs and inverts it in a single pass ('1;I'), so the
+    # result is the bytes the NEW RAM gets, with no copy in between.
+    img = fit_image(image, width, height, '1')
+    if img is None:
+        return bytes(row_bytes(width) * height)
+    return img.tobytes('raw', '1;I')
+
+
+
+# 4-gray pixel codes as packed by pack_4gray(), two bits per pixel, MSB first
+GRAY_BLACK = 0  # 0x00
+GRAY_DARK  = 1  # 0x40 (GRAY3, "gray2" in the drivers)
+GRAY_LIGHT = 2  # 0x80 (GRAY2, "gray1" in the drivers)
+GRAY_WHITE = 3  # 0xC0 (GRAY1)
+
+# 'L' value -> 2-bit code. Exact GRAY2/GRAY3 values are shifted down one level
+# before the top two bits are taken, same as the per-pixel loops used to do.
+GRAY_CODE_TABLE = bytes(0x02 if p == 0xC0 else 0x01 if p == 0x80 else p >> 6 for p in range(256))
+
+_gray_shift_tables = [bytes(c << shift for c in GRAY_CODE_TABLE) for shift in (6, 4, 2, 0)]
+_gray_plane_tables = {}
+
+
+def _or_bytes(parts):
+    # OR equal-length byte strings together using big-int arithmetic (C speed).
+    acc = 0
+    for part in parts:
+        acc |= int.from_bytes(part, 'big')
+    return acc.to_bytes(len(parts[0]), 'big')
+
+
+def pack_4gray(image, width, height, transpose=False):
+    # Pack a PIL image into 2 bits per pixel (4 pixels per byte, MSB first).
+    # Portrait images are rotated like getbuffer(); `transpose` selects the
+    # mirrored mapping used by the 4.2" drivers instead.
+    from PIL import Image
+
+    img = image.convert('L')
+    imwidth, imheight = img.size
+    if(imwidth == width and imheight == height):
+        logger.debug("Vertical")
+    elif(imwidth == height and imheight == width):
+        logger.debug("Horizontal")
+        img = img.transpose(Image.TRANSPOSE) if transpose else img.rotate(90, expand=True)
+    else:
+        logger.warning("Wrong image dimensions: must be " + str(width) + "x" + str(height))
+        return b'\xff' * (int(width / 4) * height)
+
+    raw = img.tobytes('raw')
+    if numpy is not None:
+        codes = numpy.frombuffer(raw.translate(GRAY_CODE_TABLE), dtype=numpy.uint8).reshape(-1, 4)
+        return memoryview(codes[:, 0] << 6 | codes[:, 1] << 4 | codes[:, 2] << 2 | codes[:, 3])
+    return _or_bytes([raw[i::4].translate(_gray_shift_tables[i]) for i in range(4)])
+
+
+def _plane_tables(levels):
+    tables = _gray_plane_tables.get(levels)
+    if tables is None:
+        # nibble[b] holds one bit per pixel of packed byte b, set when the
+        # pixel's code is one of `levels`
+        nibble = [0] * 256
+        for b in range(256):
+            for k in range(4):
+                if (b >> (6 - 2 * k)) & 0x03 in levels:
+                    nibble[b] |= 0x08 >> k
+        tables = (bytes(n << 4 for n in nibble), bytes(nibble))
+        _gray_plane_tables[levels] = tables
+    return tables
+
+
+def gray_plane(buf, levels):
+    # Turn a pack_4gray() buffer into one 1bpp controller plane: a bit is 1
+    # where the pixel's gray code is in `levels`. Two packed gray bytes map to
+    # one plane byte through the 256-entry tables.
+    levels = tuple(sorted(levels))
+    hi, lo = _plane_tables(levels)
+    if isinstance(buf, list):
+        buf = bytes(buf)
+    if numpy is not None:
+        packed = numpy.frombuffer(buf, dtype=numpy.uint8)
+        return memoryview(numpy.frombuffer(hi, dtype=numpy.uint8)[packed[0::2]]
+                          | numpy.frombuffer(lo, dtype=numpy.uint8)[packed[1::2]])
+    buf = bytes(buf)
+    return _or_bytes([buf[0::2].translate(hi), buf[1::2].translate(lo)])
+
+
+# Colour code -> RGB of the 7-colour (ACeP) panels: epd7in3f, epd5in65f,
+# epd4in01f. Drivers with another code order pass their own list.
+ACEP_COLORS = ((0, 0, 0), (255, 255, 255), (0, 255, 0), (0, 0, 255),
+               (255, 0, 0), (255, 255, 0), (255, 128, 0))
+
+# Colour code -> RGB of the 4-colour (black, white, yellow, red) "g" panels
+BWRY_COLORS = ((0, 0, 0), (255, 255, 255), (255, 255, 0), (255, 0, 0))
+
+# Dithering used by quantize(), with the values of PIL's Image.Dither
+DITHER_NONE = 0
+DITHER_ORDERED = 1
+DITHER_FLOYD_STEINBERG = 3
+
+# 4x4 Bayer matrix for ordered dithering, row by row
+BAYER_4 = (0, 8, 2, 10, 12, 4, 14, 6, 3, 11, 1, 9, 15, 7, 13, 5)
+
+# bytes.translate table moving a colour code into the high nibble
+NIBBLE_HIGH_TABLE = bytes((c << 4) & 0xFF for c in range(256))
+
+# bytes.translate tables moving a 2-bit colour code to the place of the
+# 1st..4th pixel of a byte
+_two_bit_tables = [bytes((c << shift) & 0xFF for c in range(256)) for shift in (6, 4, 2, 0)]
+
+_palette_images = {}
+_bayer_images = {}
+
+
+def palette_image(colors):
+    # 'P' image with `colors` as its palette (the rest black) for
+    # Image.quantize(), built once per palette
+    image = _palette_images.get(colors)
+    if image is None:
+        from PIL import Image
+
+        image = Image.new('P', (1, 1))
+        image.putpalette(sum(colors, ()) + (0, 0, 0) * (256 - len(colors)))
+        _palette_images[colors] = image
+    return image
+
+
+def bayer_image(size):
+    # The Bayer matrix tiled over an RGB image of `size`, as offsets of
+    # -120..120 around 128 (half the distance between two panel colours),
+    # built once per size
+    image = _bayer_images.get(size)
+    if image is None:
+        from PIL import Image
+
+        width, height = size
+        tiles = [bytes(int(128 + ((BAYER_4[4 * y + x] + 0.5) / 16 - 0.5) * 255) for x in range(4))
+                 * (width // 4 + 1) for y in range(4)]
+        plane = Image.frombytes('L', size, b''.join([tiles[y % 4][:width] for y in range(height)]))
+        image = Image.merge('RGB', (plane, plane, plane))
+        _bayer_images[size] = image
+    return image
+
+
+def quantize(image, colors, dither=DITHER_FLOYD_STEINBERG):
+    # Map an RGB image to the colour codes (indices into `colors`) as a 'P'
+    # image. PIL only dithers palettes with Floyd-Steinberg, so for ordered
+    # dithering the Bayer offsets are added first and every pixel then
+    # takes its nearest colour.
+    from PIL import ImageChops
+
+    if dither == DITHER_ORDERED:
+        image = ImageChops.add(image, bayer_image(image.size), 1.0, -128)
+        dither = DITHER_NONE
+    return image.quantize(palette=palette_image(colors), dither=dither)
+
+
+def pack_nibbles(codes):
+    # Pack one colour code per byte into two pixels per byte, the first
+    # pixel in the high nibble.
+    if numpy is not None:
+        codes = numpy.frombuffer(codes, dtype=numpy.uint8)
+        return (codes[0::2] << 4 | codes[1::2]).tobytes()
+    codes = bytes(codes)
+    return _or_bytes([codes[0::2].translate(NIBBLE_HIGH_TABLE), codes[1::2]])
+
+
+def pack_2bit(codes, width):
+    # Pack one 2-bit colour code per byte, `width` pixels per row, into four
+    # pixels per byte, the first pixel in the top bits. A row that doesn't
+    # fill its last byte is padded with code 0.
+    pad = -width % 4
+    if numpy is not None:
+        codes = numpy.frombuffer(codes, dtype=numpy.uint8)
+        if pad:
+            codes = numpy.pad(codes.reshape(-1, width), ((0, 0), (0, pad)))
+        codes = codes.reshape(-1, 4)
+        return (codes[:, 0] << 6 | codes[:, 1] << 4 | codes[:, 2] << 2 | codes[:, 3]).tobytes()
+    codes = bytes(codes)
+    if pad:
+        codes = bytes(pad).join([codes[y:y + width] for y in range(0, len(codes), width)]) + bytes(pad)
+    return _or_bytes([codes[i::4].translate(_two_bit_tables[i]) for i in range(4)])
+
+
+def pack_colors(image, width, height, colors=ACEP_COLORS, dither=DITHER_FLOYD_STEINBERG, exact=False):
+    # Pack a PIL image into 4-bit colour codes (index into `colors`), two
+    # pixels per byte, as bytes for one bulk transfer. Portrait images are
+    # rotated like getbuffer(). With `exact` only exact palette colours
+    # keep their code and every other pixel gets code 0.
+    from PIL import ImageChops
+
+    rgb = fit_image(image, width, height, 'RGB')
+    if rgb is None:
+        return bytes([0x11]) * (width * height // 2)
+    if not exact:
+        return pack_nibbles(quantize(rgb, colors, dither).tobytes('raw'))
+
+    indexed = quantize(rgb, colors, DITHER_NONE)
+    # Pixels whose nearest palette colour isn't an exact match
+    red, green, blue = ImageChops.difference(rgb, indexed.convert('RGB')).split()
+    mask = ImageChops.lighter(ImageChops.lighter(red, green), blue).point(lambda v: 255 if v else 0)
+    indexed.paste(0, mask=mask)
+    return pack_nibbles(indexed.tobytes('raw'))
+
+
+def pack_4color(image, width, height, colors=BWRY_COLORS, dither=DITHER_FLOYD_STEINBERG):
+    # Pack a PIL image into 2-bit colour codes (index into `colors`), four
+    # pixels per byte and rows padded to whole bytes, as bytes for one bulk
+    # transfer. Portrait images are rotated like getbuffer().
+    rgb = fit_image(image, width, height, 'RGB')
+    if rgb is None:
+        return bytes([0x55]) * ((width + 3) // 4 * height)
+    return pack_2bit(quantize(rgb, colors, dither).tobytes('raw'), width)
+
+
+def pad_rows(buf, stride, padded_stride):
+    # Widen every `stride`-byte row to `padded_stride` bytes with zeros,
+    # e.g. for a source driver wider than the panel.
+    if isinstance(buf, list):
+        buf = bytes(buf)
+    if numpy is not None:
+        rows = numpy.frombuffer(buf, dtype=numpy.uint8).reshape(-1, stride)
+        return memoryview(numpy.pad(rows, ((0, 0), (0, padded_stride - stride))).reshape(-1))
+    view = memoryview(buf)
+    pad = bytes(padded_stride - stride)
+    return b''.join([bytes(view[r:r + stride]) + pad for r in range(0, len(view), stride)])
+
+
+def rows(buf, stride, order):
+    # The `stride`-byte rows of a packed buffer in the given order, e.g.
+    # interleaved from the top and the bottom for a dual-gate panel.
+    if isinstance(buf, list):
+        buf = bytes(buf)
+    if numpy is not None:
+        return memoryview(numpy.frombuffer(buf, dtype=numpy.uint8).reshape(-1, stride)[list(order)].reshape(-1))
+    view = memoryview(buf)
+    return b''.join([view[r * stride:(r + 1) * stride] for r in order])
+
+
+def columns(buf, stride, start, end):
+    # Slice the byte columns [start, end) out of every `stride`-byte row,
+    # e.g. one controller's half of a dual-controller panel.
+    if isinstance(buf, list):
+        buf = bytes(buf)
+    if numpy is not None:
+        rows = numpy.frombuffer(buf, dtype=numpy.uint8).reshape(-1, stride)
+        # Flattened, so it slices and measures in bytes like the fallback
+        return memoryview(numpy.ascontiguousarray(rows[:, start:end]).reshape(-1))
+    view = memoryview(buf)
+    return b''.join([view[r:r + end - start] for r in range(start, len(view), stride)])
+
+
+def window(buf, stride, xstart, ystart, xend, yend):
+    # Cut the byte rectangle [xstart, xend) x [ystart, yend) out of a packed
+    # buffer with `stride` bytes per row, for windowed (partial) RAM writes.
+    # The rectangle is clipped to the buffer like the per-byte loops were.
+    if isinstance(buf, list):
+        buf = bytes(buf)
+    xstart, xend = max(xstart, 0), min(xend, stride)
+    ystart, yend = max(ystart, 0), min(yend, len(buf) // stride)
+    if xstart >= xend or ystart >= yend:
+        return b''
+    return columns(memoryview(buf)[ystart * stride:yend * stride], stride, xstart, xend)
+
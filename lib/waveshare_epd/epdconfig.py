@@ -31,12 +31,36 @@ import os
 import logging
 import sys
 import time
-import subprocess
+import struct
+import collections
 
 from ctypes import *
 
 logger = logging.getLogger(__name__)
 
+# Longest time in seconds to wait for the BUSY pin. Full refreshes of the
+# colour panels take 15-35 s; a panel that is not connected never finishes.
+BUSY_TIMEOUT = 60
+
+
+class BusyTimeoutError(RuntimeError):
+    pass
+
+
+def wait_for_edge(gpio, pin, level, timeout=None):
+    # Block on RPi.GPIO-style edge events (Jetson.GPIO, Hobot.GPIO) until
+    # `pin` reads `level`. The pin is re-read at least every 100 ms in case
+    # the edge came between the read and arming the wait.
+    if timeout is None:
+        timeout = BUSY_TIMEOUT
+    deadline = time.time() + timeout
+    edge = gpio.RISING if level else gpio.FALLING
+    while gpio.input(pin) != level:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise BusyTimeoutError("e-Paper BUSY did not go %d within %.1f s" % (level, timeout))
+        gpio.wait_for_edge(pin, edge, timeout=max(1, int(min(remaining, 0.1) * 1000)))
+
 
 class RaspberryPi:
     # Pin definition
@@ -98,6 +122,17 @@ class RaspberryPi:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_for_busy(self, level, timeout=None):
+        # gpiozero wakes on the pin edge; the Button is "pressed" when high
+        if timeout is None:
+            timeout = BUSY_TIMEOUT
+        if level:
+            reached = self.GPIO_BUSY_PIN.wait_for_press(timeout)
+        else:
+            reached = self.GPIO_BUSY_PIN.wait_for_release(timeout)
+        if not reached:
+            raise BusyTimeoutError("e-Paper BUSY did not go %d within %.1f s" % (level, timeout))
+
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
@@ -123,9 +158,9 @@ class RaspberryPi:
                 '/usr/lib',
             ]
             self.DEV_SPI = None
+            val = struct.calcsize('P') * 8
+            logging.debug("System is %d bit"%val)
             for find_dir in find_dirs:
-                val = int(os.popen('getconf LONG_BIT').read())
-                logging.debug("System is %d bit"%val)
                 if val == 64:
                     so_filename = os.path.join(find_dir, 'DEV_Config_64.so')
                 else:
@@ -201,6 +236,9 @@ class JetsonNano:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_for_busy(self, level, timeout=None):
+        wait_for_edge(self.GPIO, self.BUSY_PIN, level, timeout)
+
     def spi_writebyte(self, data):
         self.SPI.SYSFS_software_spi_transfer(data[0])
 
@@ -259,6 +297,9 @@ class SunriseX3:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_for_busy(self, level, timeout=None):
+        wait_for_edge(self.GPIO, self.BUSY_PIN, level, timeout)
+
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
@@ -301,20 +342,259 @@ class SunriseX3:
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
 
 
-if sys.version_info[0] == 2:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
-else:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
-output, _ = process.communicate()
-if sys.version_info[0] == 2:
-    output = output.decode(sys.stdout.encoding)
-
-if "Raspberry" in output:
-    implementation = RaspberryPi()
-elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
-    implementation = SunriseX3()
+class SimulatedBackend:
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    # Default BUSY time in ms after a command (power on/off, refresh).
+    # Override with EPD_SIM_LATENCY, e.g. "0x12:4000,0x20:2500".
+    BUSY_MS = {0x02: 100, 0x04: 100, 0x12: 4000, 0x20: 2500}
+    # Events kept in the trace, the oldest dropped first, so a daemon on
+    # this backend doesn't grow forever. Override with EPD_SIM_TRACE_EVENTS.
+    TRACE_EVENTS = 10000
+
+    def __init__(self):
+        # Nothing is slept: delay_ms() and BUSY time advance a virtual clock
+        # on top of the host clock, so a trace shows the time a refresh
+        # would take on hardware while the host runs at full speed.
+        self.busy_ms = dict(self.BUSY_MS)
+        for item in os.environ.get('EPD_SIM_LATENCY', '').split(','):
+            if ':' in item:
+                cmd, ms = item.split(':', 1)
+                self.busy_ms[int(cmd, 0)] = float(ms)
+        # Level of the BUSY pin while the panel is idle: 1 on UC81xx panels
+        # (epd7in5_V2), 0 on SSD16xx panels (epd2in13_V4, epd13in3k). Set
+        # by the driver through set_busy_idle() from its family's BUSY_IDLE.
+        self.busy_idle = 1
+        self.trace_file = os.environ.get('EPD_SIM_TRACE')
+        self.listeners = []
+        self.pins = {self.RST_PIN: 0, self.DC_PIN: 0, self.CS_PIN: 1, self.PWR_PIN: 0}
+        self.trace = collections.deque(maxlen=int(os.environ.get('EPD_SIM_TRACE_EVENTS', self.TRACE_EVENTS)))
+        self.start = time.perf_counter()
+        self.skipped_ms = 0.0
+        self.busy_until = 0.0
+
+    def now_ms(self):
+        return (time.perf_counter() - self.start) * 1000.0 + self.skipped_ms
+
+    def record(self, kind, data=b''):
+        event = (self.now_ms(), kind, bytes(data))
+        self.trace.append(event)
+        for listener in self.listeners:
+            listener(*event)
+
+    def add_listener(self, listener):
+        # listener(t_ms, kind, data) is called for every traced event
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def set_busy_idle(self, level):
+        # The simulated panel has no BUSY polarity of its own; it takes the
+        # one of the driver talking to it
+        self.busy_idle = level
+
+    def digital_write(self, pin, value):
+        if pin == self.RST_PIN and value and not self.pins[pin]:
+            self.record('reset')
+        self.pins[pin] = value
+
+    def digital_read(self, pin):
+        if pin == self.BUSY_PIN:
+            now = self.now_ms()
+            if now < self.busy_until:
+                # Report busy once, then jump the clock to the end of the
+                # refresh so polling loops finish after a single iteration.
+                self.record('busy', b'')
+                self.skipped_ms += self.busy_until - now
+                return 1 - self.busy_idle
+            return self.busy_idle
+        return self.pins.get(pin, 0)
+
+    def delay_ms(self, delaytime):
+        self.skipped_ms += delaytime
+
+    def wait_for_busy(self, level, timeout=None):
+        if timeout is None:
+            timeout = BUSY_TIMEOUT
+        now = self.now_ms()
+        busy = now < self.busy_until
+        if level == (1 - self.busy_idle if busy else self.busy_idle):
+            return
+        # Jump the clock to the end of the refresh; a level the panel never
+        # reaches (wrong polarity for this panel) runs into the timeout.
+        self.record('busy', b'')
+        wait = self.busy_until - now if busy else float('inf')
+        if wait > timeout * 1000.0:
+            self.skipped_ms += timeout * 1000.0
+            raise BusyTimeoutError("e-Paper BUSY did not go %d within %.1f s" % (level, timeout))
+        self.skipped_ms += wait
+
+    def spi_writebyte(self, data):
+        self.write(data)
+
+    def spi_writebyte2(self, data):
+        self.write(data)
+
+    def DEV_SPI_write(self, data):
+        self.write([data])
+
+    def DEV_SPI_nwrite(self, data):
+        self.write(data)
+
+    def DEV_SPI_read(self):
+        return 0
+
+    def write(self, data):
+        data = bytes(data)
+        if self.pins[self.DC_PIN]:
+            self.record('data', data)
+        else:
+            self.record('command', data)
+            busy = self.busy_ms.get(data[-1]) if data else None
+            if busy:
+                self.busy_until = self.now_ms() + busy
+
+    def save_trace(self, path):
+        # One event per line: "<t_ms> <kind> <hex bytes>"
+        with open(path, 'w') as f:
+            for t, kind, data in self.trace:
+                f.write("%.3f %s %s\n" % (t, kind, data.hex()))
+
+    def module_init(self, cleanup=False):
+        self.pins[self.PWR_PIN] = 1
+        return 0
+
+    def module_exit(self, cleanup=False):
+        logger.debug("spi end")
+        self.pins[self.RST_PIN] = 0
+        self.pins[self.DC_PIN] = 0
+        self.pins[self.PWR_PIN] = 0
+        if self.trace_file:
+            self.save_trace(self.trace_file)
+            logger.debug("trace written to %s", self.trace_file)
+
+
+def load_trace(path):
+    # Read a trace written by SimulatedBackend.save_trace() as a list of
+    # (t_ms, kind, data) tuples.
+    trace = []
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                data = bytes.fromhex(parts[2]) if len(parts) > 2 else b''
+                trace.append((float(parts[0]), parts[1], data))
+    return trace
+
+
+def replay_trace(path, realtime=False):
+    # Play a captured trace back through the active backend: onto a real
+    # panel, or into a SimulatedBackend to re-measure it. With `realtime`
+    # the recorded gaps between events are reproduced with delay_ms().
+    last = None
+    for t, kind, data in load_trace(path):
+        if realtime and last is not None and t > last:
+            delay_ms(t - last)
+        last = t
+        if kind == 'reset':
+            digital_write(RST_PIN, 0)
+            delay_ms(2)
+            digital_write(RST_PIN, 1)
+        elif kind == 'command' or kind == 'data':
+            digital_write(DC_PIN, 1 if kind == 'data' else 0)
+            digital_write(CS_PIN, 0)
+            spi_writebyte2(data)
+            digital_write(CS_PIN, 1)
+
+
+# spidev refuses transfers larger than its bufsiz module parameter (4096 by
+# default), so bulk data is streamed in chunks of at most this many bytes.
+SPI_MAX_TRANSFER = 4096
+
+
+def spi_writebuffer(data, chunk_size=SPI_MAX_TRANSFER):
+    # Send a whole data buffer (list, bytes or memoryview) to the panel with
+    # DC high, toggling DC/CS once per chunk instead of once per byte.
+    if isinstance(data, list):
+        data = bytes(data)
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        digital_write(DC_PIN, 1)
+        digital_write(CS_PIN, 0)
+        spi_writebyte2(view[start:start + chunk_size])
+        digital_write(CS_PIN, 1)
+
+
+# Platform detection result, cached per boot so repeated runs (cron) skip it.
+# It is kept in the user's own runtime or cache directory: in a shared
+# temporary directory another user could plant it and pick the backend.
+PLATFORM_CACHE = os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'waveshare_epd_platform')
+
+def _read_text(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read().decode('ascii', 'replace')
+    except (IOError, OSError):
+        return ''
+
+def _read_cache(path):
+    # The cache file's text, or '' unless this user owns it and nobody
+    # else can write to it
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ''
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        logger.debug("Ignoring platform cache %s: not private to this user", path)
+        return ''
+    return _read_text(path)
+
+PLATFORMS = ('RaspberryPi', 'SunriseX3', 'JetsonNano')
+
+def detect_platform():
+    # A cache that names no known platform (corrupt, or from another
+    # version) is probed again
+    boot_id = _read_text('/proc/sys/kernel/random/boot_id').strip()
+    cached = _read_cache(PLATFORM_CACHE).split()
+    if boot_id and len(cached) == 2 and cached[0] == boot_id and cached[1] in PLATFORMS:
+        return cached[1]
+
+    if "Raspberry" in _read_text('/proc/device-tree/model') or "Raspberry" in _read_text('/proc/cpuinfo'):
+        platform = 'RaspberryPi'
+    elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
+        platform = 'SunriseX3'
+    else:
+        platform = 'JetsonNano'
+
+    if boot_id:
+        try:
+            os.makedirs(os.path.dirname(PLATFORM_CACHE), mode=0o700, exist_ok=True)
+            fd = os.open(PLATFORM_CACHE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                os.fchmod(f.fileno(), 0o600)
+                f.write("%s %s\n" % (boot_id, platform))
+        except (IOError, OSError):
+            logger.debug("Cannot write platform cache %s", PLATFORM_CACHE)
+    return platform
+
+# EPD_BACKEND=simulated selects SimulatedBackend, so drivers can be run and
+# profiled on machines without the panel hardware.
+if os.environ.get('EPD_BACKEND', '').lower() == 'simulated':
+    implementation = SimulatedBackend()
 else:
-    implementation = JetsonNano()
+    implementation = {
+        'RaspberryPi': RaspberryPi,
+        'SunriseX3': SunriseX3,
+        'JetsonNano': JetsonNano,
+    }[detect_platform()]()
 
 for func in [x for x in dir(implementation) if not x.startswith('_')]:
     setattr(sys.modules[__name__], func, getattr(implementation, func))
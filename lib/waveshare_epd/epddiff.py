@@ -0,0 +1,142 @@
+# *****************************************************************************
+# * | File        :	  epddiff.py
+# * | Function    :   Dirty rectangles between two packed 1-bit frames
+# * | Info        :
+# *----------------
+# * | Info        :   Finds the byte-aligned rectangles that changed between
+# * |                 the frame on the panel and the next one, merges them
+# * |                 where one bigger partial refresh is cheaper than
+# * |                 several small ones, and falls back to a full refresh
+# * |                 when too much of the screen changed.
+# -----------------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+# Rectangles are (xstart, ystart, xend, yend) with x in bytes (8 pixels) and
+# y in rows, ends exclusive, the same units as epdbuffer.window().
+
+# Cost model of one partial refresh: a fixed time the panel stays BUSY
+# (waveform and power up/down, ~300 ms on the 7.5" V2) plus the time to send
+# the window (4 MHz SPI and per-chunk overhead, ~4 us a byte).
+REFRESH_MS = 300.0
+BYTE_MS = 0.004
+
+
+def _row_bits(old, new, y, stride):
+    # Changed bits of row y as an integer, MSB = leftmost pixel
+    row = slice(y * stride, (y + 1) * stride)
+    if old[row] == new[row]:
+        return 0
+    return int.from_bytes(old[row], 'big') ^ int.from_bytes(new[row], 'big')
+
+
+def _column_runs(bits, stride):
+    # Runs [start, end) of byte columns with a set bit in `bits`
+    runs = []
+    start = None
+    for x, byte in enumerate(bits.to_bytes(stride, 'big')):
+        if byte and start is None:
+            start = x
+        elif not byte and start is not None:
+            runs.append((start, x))
+            start = None
+    if start is not None:
+        runs.append((start, stride))
+    return runs
+
+
+def dirty_rects(old, new, stride):
+    # Changed rectangles: every band of consecutive changed rows is split
+    # into the column runs that changed anywhere in the band, and each run
+    # is trimmed to the rows that changed within its columns
+    old, new = [memoryview(bytes(buf) if isinstance(buf, list) else buf) for buf in (old, new)]
+    height = len(new) // stride
+    rects = []
+    band = []
+    for y in range(height + 1):
+        bits = _row_bits(old, new, y, stride) if y < height else 0
+        if bits:
+            band.append((y, bits))
+            continue
+        if not band:
+            continue
+        band_bits = 0
+        for _, row_bits in band:
+            band_bits |= row_bits
+        for xstart, xend in _column_runs(band_bits, stride):
+            mask = ((1 << (xend - xstart) * 8) - 1) << (stride - xend) * 8
+            rows = [row_y for row_y, row_bits in band if row_bits & mask]
+            rects.append((xstart, rows[0], xend, rows[-1] + 1))
+        band = []
+    return rects
+
+
+def area(rect):
+    return (rect[2] - rect[0]) * (rect[3] - rect[1])
+
+
+def cost(rect, refresh_ms=REFRESH_MS, byte_ms=BYTE_MS):
+    return refresh_ms + area(rect) * byte_ms
+
+
+def merge_rects(rects, refresh_ms=REFRESH_MS, byte_ms=BYTE_MS, max_bytes=None):
+    # Greedily replace the pair of rectangles whose bounding box saves the
+    # most time over refreshing both, until no merge saves anything. A
+    # merged box may now overlap others; the next rounds pick those up.
+    # Merges that would take the total area over `max_bytes` are skipped,
+    # so changes far apart (a clock and a chart label) stay separate
+    # partial refreshes instead of growing into a full one.
+    rects = list(rects)
+    total = sum(area(rect) for rect in rects)
+    while len(rects) > 1:
+        best = None
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                box = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                saving = (cost(a, refresh_ms, byte_ms) + cost(b, refresh_ms, byte_ms)
+                          - cost(box, refresh_ms, byte_ms))
+                if max_bytes is not None and total - area(a) - area(b) + area(box) > max_bytes:
+                    continue
+                if saving > 0 and (best is None or saving > best[0]):
+                    best = (saving, i, j, box)
+        if best is None:
+            break
+        _, i, j, box = best
+        total += area(box) - area(rects[i]) - area(rects[j])
+        rects[i] = box
+        del rects[j]
+    return sorted(rects, key=lambda rect: (rect[1], rect[0]))
+
+
+def plan(old, new, stride, max_area=0.25, refresh_ms=REFRESH_MS, byte_ms=BYTE_MS):
+    # Partial refreshes that bring the panel from `old` to `new`:
+    #   []    nothing changed
+    #   None  a full refresh is needed (no old frame, or more than
+    #         `max_area` of the screen changed)
+    #   rects otherwise, merged by the cost model while they stay within
+    #         `max_area`
+    if old is None or len(old) != len(new):
+        return None
+    if old == new:
+        return []
+    rects = dirty_rects(old, new, stride)
+    if sum(area(rect) for rect in rects) > max_area * len(new):
+        return None
+    return merge_rects(rects, refresh_ms, byte_ms, max_area * len(new))
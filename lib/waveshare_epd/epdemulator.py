@@ -0,0 +1,271 @@
+# *****************************************************************************
+# * | File        :	  epdemulator.py
+# * | Function    :   Rebuild panel RAM from simulated SPI traffic
+# * | Info        :
+# *----------------
+# * | Info        :   Attach an emulator to epdconfig's SimulatedBackend
+# * |                 (EPD_BACKEND=simulated). It decodes the controller
+# * |                 commands, keeps a copy of the display RAM and keeps a
+# * |                 frame (optionally written as a PNG) on every refresh.
+# -----------------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import os
+import logging
+
+from . import epdbuffer
+
+logger = logging.getLogger(__name__)
+
+
+class PanelEmulator:
+    # Command codes that write display RAM, mapped to the RAM plane name
+    RAM_COMMANDS = {}
+    # Command code that starts a refresh
+    REFRESH_COMMAND = None
+    # Value of a RAM bit that shows as black
+    BLACK_BIT = 0
+
+    def __init__(self, width, height, out_dir=None, prefix='frame'):
+        self.width = width
+        self.height = height
+        self.stride = epdbuffer.row_bytes(width)
+        self.out_dir = out_dir
+        if out_dir:
+            # Frames are saved from inside the driver's display() call
+            os.makedirs(out_dir, exist_ok=True)
+        self.prefix = prefix
+        fill = 0xFF if self.BLACK_BIT == 0 else 0x00
+        self.ram = dict((name, bytearray([fill]) * (self.stride * height))
+                        for name in set(self.RAM_COMMANDS.values()))
+        self.frames = []
+        # SPI bytes (commands and data) sent for each refresh
+        self.wire_bytes = []
+        self.pending_bytes = 0
+        self.command = None
+        self.params = bytearray()
+        self.reset_window()
+
+    def attach(self, backend):
+        # The driver sets the backend's BUSY polarity itself
+        backend.add_listener(self.feed)
+        return self
+
+    def feed(self, t, kind, data):
+        if kind == 'reset':
+            self.reset()
+        elif kind == 'command':
+            self.pending_bytes += len(data)
+            for command in data:
+                self.on_command(command)
+        elif kind == 'data':
+            self.pending_bytes += len(data)
+            if self.command in self.RAM_COMMANDS:
+                self.write_ram(self.RAM_COMMANDS[self.command], data)
+            else:
+                self.params += data
+                self.on_params(self.command, self.params)
+
+    def on_command(self, command):
+        self.command = command
+        self.params = bytearray()
+        if command in self.RAM_COMMANDS:
+            self.start_ram_write()
+        if command == self.REFRESH_COMMAND:
+            self.refresh()
+
+    def on_params(self, command, params):
+        pass
+
+    def reset(self):
+        self.reset_window()
+
+    def reset_window(self):
+        self.xstart, self.xend = 0, self.stride - 1
+        self.ystart, self.yend = 0, self.height - 1
+        self.x, self.y = 0, 0
+        self.xstep, self.ystep = 1, 1
+
+    def start_ram_write(self):
+        pass
+
+    def write_ram(self, name, data):
+        ram = self.ram[name]
+        if self.xstep != 1 or not self.xstart <= self.x <= self.xend:
+            self.write_bytes(ram, data)
+            return
+        # Left to right: copy up to the end of the window row at a time
+        data = memoryview(data)
+        i = 0
+        while i < len(data):
+            count = min(len(data) - i, self.xend - self.x + 1)
+            if 0 <= self.y < self.height:
+                start, end = max(self.x, 0), min(self.x + count, self.stride)
+                if start < end:
+                    row = self.y * self.stride
+                    ram[row + start:row + end] = data[i + start - self.x:i + end - self.x]
+            i += count
+            if self.x + count - 1 == self.xend:
+                self.x = self.xstart
+                self.y = self.ystart if self.y == self.yend else self.y + self.ystep
+            else:
+                self.x += count
+
+    def write_bytes(self, ram, data):
+        # Any address order, one byte at a time
+        for byte in data:
+            if 0 <= self.x < self.stride and 0 <= self.y < self.height:
+                ram[self.y * self.stride + self.x] = byte
+            if self.x == self.xend:
+                self.x = self.xstart
+                self.y = self.ystart if self.y == self.yend else self.y + self.ystep
+            else:
+                self.x += self.xstep
+
+    def display_plane(self):
+        raise NotImplementedError
+
+    def image(self):
+        # Current panel content as a PIL '1' image (0 = black)
+        from PIL import Image
+
+        plane = bytes(self.ram[self.display_plane()])
+        if self.BLACK_BIT:
+            plane = bytes(epdbuffer.invert(plane))
+        return Image.frombytes('1', (self.width, self.height), plane)
+
+    def refresh(self):
+        self.wire_bytes.append(self.pending_bytes)
+        self.pending_bytes = 0
+        frame = bytes(self.ram[self.display_plane()])
+        self.frames.append(frame)
+        if self.out_dir:
+            path = os.path.join(self.out_dir, '%s_%04d.png' % (self.prefix, len(self.frames)))
+            self.image().save(path)
+            logger.debug("refresh %d written to %s", len(self.frames), path)
+
+
+class UC81xx(PanelEmulator):
+    # UC8179 class (epd7in5_V2, epd4in2, ...): 0x10 old data, 0x13 new data,
+    # 0x90 partial window, 0x91/0x92 partial in/out, 0x12 refresh
+    RAM_COMMANDS = {0x10: 'old', 0x13: 'new'}
+    REFRESH_COMMAND = 0x12
+    BLACK_BIT = 1
+
+    def __init__(self, width, height, out_dir=None, prefix='frame'):
+        self.partial = False
+        self.partial_window = None
+        # DDX[0] of the 0x50 VCOM/data interval setting flips the data
+        # polarity (display_Partial sets it); RAM is kept as 1 = black.
+        self.ddx_invert = False
+        PanelEmulator.__init__(self, width, height, out_dir, prefix)
+
+    def reset(self):
+        # A hardware reset also leaves partial mode and restores CDI
+        self.partial = False
+        self.ddx_invert = False
+        PanelEmulator.reset(self)
+
+    def on_command(self, command):
+        if command == 0x91:
+            self.partial = True
+        elif command == 0x92:
+            self.partial = False
+        PanelEmulator.on_command(self, command)
+
+    def on_params(self, command, params):
+        if command == 0x50 and len(params) == 1:
+            self.ddx_invert = bool(params[0] & 0x01)
+        elif command == 0x90 and len(params) == 8:
+            # HRST, HRED, VRST, VRED: 16-bit big-endian, pixel units
+            hrst, hred, vrst, vred = [params[i] << 8 | params[i + 1] for i in range(0, 8, 2)]
+            self.partial_window = (hrst // 8, hred // 8, vrst, vred)
+
+    def start_ram_write(self):
+        self.reset_window()
+        if self.partial and self.partial_window:
+            self.xstart, self.xend, self.ystart, self.yend = self.partial_window
+            self.x, self.y = self.xstart, self.ystart
+
+    def write_ram(self, name, data):
+        if self.ddx_invert:
+            data = epdbuffer.invert(data)
+        PanelEmulator.write_ram(self, name, data)
+
+    def display_plane(self):
+        return 'new'
+
+
+class SSD16xx(PanelEmulator):
+    # SSD1680/SSD1677 class (epd2in13_V4, epd13in3k, ...): 0x24 B/W RAM,
+    # 0x26 red/old RAM, 0x44/0x45 window, 0x4E/0x4F address counter,
+    # 0x11 data entry mode, 0x20 master activation
+    RAM_COMMANDS = {0x24: 'bw', 0x26: 'red'}
+    REFRESH_COMMAND = 0x20
+    BLACK_BIT = 0
+
+    def x_address(self, params):
+        # One byte is already in RAM bytes; two bytes are a pixel address
+        if len(params) == 1:
+            return params[0]
+        return (params[0] | params[1] << 8) // 8
+
+    def on_params(self, command, params):
+        if command == 0x11 and len(params) == 1:
+            self.xstep = 1 if params[0] & 0x01 else -1
+            self.ystep = 1 if params[0] & 0x02 else -1
+        elif command == 0x44:
+            if len(params) == 2:
+                self.xstart, self.xend = params[0], params[1]
+            elif len(params) == 4:
+                self.xstart, self.xend = self.x_address(params[0:2]), self.x_address(params[2:4])
+            self.x = self.xstart
+        elif command == 0x45 and len(params) == 4:
+            self.ystart = params[0] | params[1] << 8
+            self.yend = params[2] | params[3] << 8
+            self.y = self.ystart
+        elif command == 0x4E:
+            self.x = self.x_address(params)
+        elif command == 0x4F and len(params) == 2:
+            self.y = params[0] | params[1] << 8
+
+    def display_plane(self):
+        return 'bw'
+
+
+# Controller family of the drivers the emulator has been checked against
+CONTROLLERS = {
+    'epd7in5_V2': UC81xx,
+    'epd4in2': UC81xx,
+    'epd2in13_V4': SSD16xx,
+    'epd13in3k': SSD16xx,
+}
+
+
+def attach(epd, out_dir=None, prefix='frame'):
+    # Emulate the panel driven by `epd` (an EPD instance) on the simulated
+    # backend. Returns the emulator; its frames/wire_bytes grow per refresh.
+    from . import epdconfig
+
+    name = type(epd).__module__.rsplit('.', 1)[-1]
+    if name not in CONTROLLERS:
+        raise ValueError("No emulator for %s" % name)
+    emulator = CONTROLLERS[name](epd.width, epd.height, out_dir, prefix)
+    return emulator.attach(epdconfig.implementation)
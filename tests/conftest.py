@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# The drivers run on epdconfig's SimulatedBackend, which is chosen when
+# epdconfig is first imported
+os.environ['EPD_BACKEND'] = 'simulated'
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'lib'))
+
+
+@pytest.fixture
+def weather(tmp_path, monkeypatch):
+    # weather.py with its files in tmp_path (the log file goes to the
+    # working directory on first import) and no panel state kept from
+    # other tests
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(ROOT)
+    import weather
+
+    cache_dir = str(tmp_path / 'cache')
+    monkeypatch.setattr(weather, 'CACHE_DIR', cache_dir)
+    monkeypatch.setattr(weather, 'FRAME_FILE', str(tmp_path / 'last_frame.bin'))
+    monkeypatch.setattr(weather, 'STATE_FILE', str(tmp_path / 'display_state.json'))
+    monkeypatch.setattr(weather, 'response_cache', weather.ResponseCache(cache_dir))
+    monkeypatch.setattr(weather, 'circuit', weather.CircuitBreaker(os.path.join(cache_dir, 'circuit.json')))
+    monkeypatch.setattr(weather, 'panels', {})
+    monkeypatch.setattr(weather, 'displayed', {})
+    monkeypatch.setattr(weather, 'layouts', {})
+    monkeypatch.setattr(weather, 'fonts', weather.FontCache(os.path.join(ROOT, 'font', 'Sarcaland Brusher.otf')))
+    monkeypatch.setattr(weather, 'icons', weather.IconAtlas(cache_file=str(tmp_path / 'icon_cache.bin')))
+    return weather
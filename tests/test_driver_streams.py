@@ -0,0 +1,163 @@
+# Every driver must put the same commands and data on the wire as the
+# original Waveshare drivers did. The streams of init(), display() and
+# Clear() are recorded on epdconfig's SimulatedBackend and compared with
+# golden/driver_streams.json, recorded the same way from the drivers as
+# first imported from Waveshare (with values masked to a byte, as spidev
+# sends them). Drivers that import RPi.GPIO are skipped where it is missing.
+
+import hashlib
+import inspect
+import json
+import os
+
+import pytest
+from PIL import Image, ImageDraw
+
+from waveshare_epd import PANELS, load_driver, epdconfig
+
+GOLDEN_FILE = os.path.join(os.path.dirname(__file__), 'golden', 'driver_streams.json')
+
+# Exact panel colours, so no driver has anything to dither
+RGB = {'black': (0, 0, 0), 'white': (255, 255, 255), 'red': (255, 0, 0), 'yellow': (255, 255, 0),
+       'green': (0, 255, 0), 'blue': (0, 0, 255), 'orange': (255, 128, 0)}
+
+# Drivers whose init()/display()/Clear() are named differently or take
+# arguments: {name: {phase: (method, args)}}, args of a callable are
+# computed from the EPD instance
+CALLS = {
+    'epd1in02': {'init': ('Init', ())},
+    'epd1in54': {'init': ('init', lambda epd: (epd.lut_full_update,))},
+    'epd1in54_V2': {'init': ('init', (False,))},
+    'epd2in13': {'init': ('init', lambda epd: (epd.lut_full_update,))},
+    'epd2in13_V2': {'init': ('init', lambda epd: (epd.FULL_UPDATE,))},
+    'epd2in66': {'init': ('init', (0,))},
+    'epd2in9': {'init': ('init', lambda epd: (epd.lut_full_update,))},
+    'epd3in7': {'init': ('init', (1,)), 'display': ('display_1Gray', ()), 'Clear': ('Clear', (0xFF, 1))},
+}
+
+
+def sample_image(width, height, colors, seed=0):
+    # A bar in each panel colour over shapes in black, different per seed
+    image = Image.new('RGB', (width, height), RGB['white'])
+    draw = ImageDraw.Draw(image)
+    bar = width / len(colors)
+    for i, color in enumerate(colors):
+        draw.rectangle([int(i * bar), 0, int((i + 1) * bar) - 1, height // 4], fill=RGB[color])
+    if seed:
+        draw.rectangle([width // 5, height // 3, width * 3 // 5, height * 5 // 6], fill=RGB['black'])
+    else:
+        draw.ellipse([width // 8, height // 3, width * 7 // 8, height - 2], outline=RGB['black'], width=3)
+        draw.line([0, height - 1, width - 1, height // 3], fill=RGB['black'], width=2)
+    return image
+
+
+class Recorder:
+    # Records the wire stream and answers BUSY reads without waiting: the
+    # first read after a transfer gives the panel's idle level, further
+    # reads alternate, so every polling loop ends after a read or two
+    def __init__(self, busy_idle):
+        self.busy_idle = busy_idle
+        self.reads = 0
+        self.events = []
+
+    def listener(self, t, kind, data):
+        if kind != 'busy':
+            self.reads = 0
+            self.events.append((kind, bytes(data)))
+
+    def digital_read(self, pin):
+        if pin == epdconfig.BUSY_PIN:
+            self.reads += 1
+            return self.busy_idle if self.reads % 2 else 1 - self.busy_idle
+        return epdconfig.implementation.digital_read(pin)
+
+    def wait_for_busy(self, level, timeout=None):
+        pass
+
+    def __enter__(self):
+        self.saved = epdconfig.digital_read, epdconfig.wait_for_busy
+        epdconfig.digital_read, epdconfig.wait_for_busy = self.digital_read, self.wait_for_busy
+        epdconfig.implementation.add_listener(self.listener)
+        return self
+
+    def __exit__(self, *exc):
+        epdconfig.implementation.remove_listener(self.listener)
+        epdconfig.digital_read, epdconfig.wait_for_busy = self.saved
+
+    def stream(self):
+        # Resets, commands and data, with consecutive data transfers joined:
+        # how many SPI writes carry the bytes is up to the driver
+        merged = []
+        for kind, data in self.events:
+            if kind == 'data' and merged and merged[-1][0] == 'data':
+                merged[-1] = ('data', merged[-1][1] + data)
+            else:
+                merged.append((kind, data))
+        return b''.join(kind[0].encode() + len(data).to_bytes(4, 'big') + data for kind, data in merged)
+
+
+def call(epd, name, phase, args=()):
+    method, default_args = CALLS.get(name, {}).get(phase, (phase, ()))
+    if callable(default_args):
+        default_args = default_args(epd)
+    return getattr(epd, method)(*(args or default_args))
+
+
+def record_streams(name, busy_idle=None):
+    # {phase: {'sha256', 'bytes'}} of driver `name`'s init, display and Clear
+    epd = load_driver(name).EPD()
+    if busy_idle is None:
+        busy_idle = getattr(epd, 'BUSY_IDLE', 1)
+    colors = PANELS[name].colors
+    method = CALLS.get(name, {}).get('display', ('display', ()))[0]
+    planes = len(inspect.signature(getattr(epd, method)).parameters)
+    if planes == 1:
+        buffers = (epd.getbuffer(sample_image(epd.width, epd.height, colors)),)
+    else:
+        # Black and red/yellow planes from two black and white images
+        buffers = tuple(epd.getbuffer(sample_image(epd.width, epd.height, ('black', 'white'), seed))
+                        for seed in range(planes))
+    streams = {}
+    for phase, args in (('init', ()), ('display', buffers), ('Clear', ())):
+        with Recorder(busy_idle) as recorder:
+            call(epd, name, phase, args)
+        stream = recorder.stream()
+        streams[phase] = {'sha256': hashlib.sha256(stream).hexdigest(), 'bytes': len(stream)}
+    return streams
+
+
+with open(GOLDEN_FILE) as f:
+    GOLDEN = json.load(f)
+
+
+@pytest.mark.parametrize('name', sorted(GOLDEN))
+def test_driver_stream(name):
+    try:
+        load_driver(name)
+    except ImportError as e:
+        pytest.skip(f"{name} needs {e.name}")
+    golden = GOLDEN[name]
+    assert record_streams(name, golden['busy_idle']) == golden['streams']
+
+
+# Drivers weather.display_frame() refreshes with init_part() and
+# display_Partial(window, ...)
+PARTIAL_DRIVERS = ('epd7in5_V2', 'epd7in5_V2_old')
+
+
+@pytest.mark.parametrize('name', PARTIAL_DRIVERS)
+def test_partial_window(name):
+    from waveshare_epd import epdbuffer
+
+    epd = load_driver(name).EPD()
+    frame = epd.getbuffer(sample_image(epd.width, epd.height, ('black', 'white')))
+    stride = epdbuffer.row_bytes(epd.width)
+    window = epdbuffer.window(frame, stride, 5, 40, 30, 200)
+    epd.init_part()
+    with Recorder(epd.BUSY_IDLE) as recorder:
+        epd.display_Partial(window, 5 * 8, 40, 30 * 8, 200)
+    commands = [data for kind, data in recorder.events if kind == 'command']
+    start = recorder.events.index(('command', b'\x13')) + 1
+    sent = b''.join(data for kind, data in recorder.events[start:] if kind == 'data')
+    assert b'\x91' in commands and b'\x12' in commands
+    assert sent == bytes(epdbuffer.invert(window))
@@ -0,0 +1,15 @@
+import pytest
+
+from waveshare_epd import epdbench
+
+
+@pytest.mark.parametrize('name', ['epd4in01f', 'epd5in65f', 'epd7in3e', 'epd7in3f'])
+def test_packing_matches_legacy(name):
+    assert epdbench.measure_packing(name, repeat=1)['same']
+
+
+def test_memory_display_does_not_copy_frame():
+    # epd7in5_V2 streams the packed frame to SPI without copying it
+    result = epdbench.measure_memory('epd7in5_V2')
+    assert result['frame_kb'] == 800 * 480 / 8 / 1024
+    assert 0 < result['display_kb'] < result['frame_kb'] / 4
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from waveshare_epd import epdconfig
+
+BOOT_ID = epdconfig._read_text('/proc/sys/kernel/random/boot_id').strip()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    if not BOOT_ID:
+        pytest.skip("no boot_id")
+    path = str(tmp_path / 'platform')
+    monkeypatch.setattr(epdconfig, 'PLATFORM_CACHE', path)
+    return path
+
+
+def write(path, text, mode=0o600):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.chmod(path, mode)
+
+
+def test_cached_platform(cache):
+    write(cache, "%s SunriseX3\n" % BOOT_ID)
+    assert epdconfig.detect_platform() == 'SunriseX3'
+
+
+@pytest.mark.parametrize('text', ["%s Bogus\n", "%s\n", "garbage", "other-boot SunriseX3\n"])
+def test_invalid_cache_is_probed_again(cache, text):
+    write(cache, text % BOOT_ID if '%s' in text else text)
+    platform = epdconfig.detect_platform()
+    assert platform in epdconfig.PLATFORMS
+    assert epdconfig._read_text(cache) == "%s %s\n" % (BOOT_ID, platform)
+
+
+def test_cache_writable_by_others_is_ignored(cache):
+    write(cache, "%s SunriseX3\n" % BOOT_ID, 0o666)
+    probed = epdconfig.detect_platform()
+    assert oct(os.stat(cache).st_mode & 0o777) == oct(0o600)
+    assert epdconfig._read_text(cache) == "%s %s\n" % (BOOT_ID, probed)
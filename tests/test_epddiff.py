@@ -0,0 +1,23 @@
+from waveshare_epd import epddiff
+
+
+def test_plan_merges_nearby_changes():
+    old = bytes(1000)
+    new = bytearray(old)
+    new[0] = new[11] = 0xff
+    assert epddiff.plan(old, bytes(new), 10) == [(0, 0, 2, 2)]
+
+
+def test_plan_keeps_distant_changes_partial():
+    # Two one-byte changes in opposite corners would merge into the whole
+    # screen; within max_area they stay two partial refreshes
+    old = bytes(1000)
+    new = bytearray(old)
+    new[0] = new[-1] = 0xff
+    assert epddiff.plan(old, bytes(new), 10) == [(0, 0, 1, 1), (9, 99, 10, 100)]
+    assert epddiff.plan(old, bytes(new), 10, max_area=1.0) == [(0, 0, 10, 100)]
+
+
+def test_plan_full_refresh_for_large_changes():
+    old = bytes(1000)
+    assert epddiff.plan(old, b'\xff' * 300 + bytes(700), 10) is None
@@ -0,0 +1,19 @@
+from PIL import Image, ImageDraw
+
+from waveshare_epd import epdemulator, epdconfig, load_driver
+
+
+def test_frame_matches_image(tmp_path):
+    epd = load_driver('epd7in5_V2').EPD()
+    image = Image.new('1', (epd.width, epd.height), 1)
+    ImageDraw.Draw(image).rectangle([100, 50, 517, 300], fill=0)
+    out_dir = tmp_path / 'frames'
+    emulator = epdemulator.attach(epd, str(out_dir))
+    try:
+        epd.init()
+        epd.display(epd.getbuffer(image))
+    finally:
+        epdconfig.implementation.remove_listener(emulator.feed)
+    assert emulator.frames[-1] == bytes(epd.getbuffer(image))
+    assert emulator.image().tobytes() == image.tobytes()
+    assert (out_dir / 'frame_0001.png').exists()
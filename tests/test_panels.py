@@ -0,0 +1,24 @@
+# weather.py drives every panel in PANELS the same way: a full refresh
+# through LazyEPD's init_full(), clear(), display_full() and sleep(). On
+# the simulated backend this also checks each driver's BUSY polarity.
+
+import pytest
+from PIL import Image, ImageDraw
+
+from waveshare_epd import PANELS, get_epd, load_driver
+
+
+@pytest.mark.parametrize('name', sorted(PANELS))
+def test_full_refresh(name):
+    try:
+        load_driver(name)
+    except ImportError as e:
+        pytest.skip(f"{name} needs {e.name}")
+    epd = get_epd(name)
+    image = Image.new('1', (epd.width, epd.height), 1)
+    ImageDraw.Draw(image).rectangle([0, 0, epd.width // 2, epd.height // 2], fill=0)
+    epd.init_full()
+    epd.clear()
+    epd.display_full(epd.getbuffer(image))
+    epd.sleep()
+    assert epd.partial_refresh == (name in ('epd7in5_V2', 'epd7in5_V2_old'))
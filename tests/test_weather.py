@@ -0,0 +1,272 @@
+import http.server
+import json
+import threading
+
+import pytest
+
+
+def test_sites_on_one_panel_share_its_state(weather, monkeypatch):
+    # Two sites with the same model take turns on one panel: the second
+    # diffs against the frame the first left on it
+    monkeypatch.setattr(weather, 'LOCATIONS', [
+        {'name': 'A', 'lat': 1, 'lon': 2},
+        {'name': 'B', 'lat': 3, 'lon': 4},
+        {'name': 'C', 'lat': 5, 'lon': 6, 'model': 'epd7in3f'},
+    ])
+    a, b, c = weather.configured_sites()
+    assert a.epd is b.epd and a.frame_file == b.frame_file and a.state_file == b.state_file
+    assert c.frame_file != a.frame_file
+
+    plans = []
+    plan = weather.epddiff.plan
+    monkeypatch.setattr(weather.epddiff, 'plan', lambda *args: plans.append(plan(*args)) or plans[-1])
+    frame = bytes(a.epd.width * a.epd.height // 8)
+    weather.display_frame(frame, a)
+    weather.display_frame(frame, b)
+    assert plans == [None, []]
+
+
+class StubAPI(http.server.ThreadingHTTPServer):
+    # Answers each GET with the next of `responses` ((status, headers,
+    # JSON body or None), the last one repeated) and keeps the headers of
+    # every request
+    def __init__(self):
+        http.server.ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.responses = [(200, {}, {})]
+        self.requests = []
+        self.url = 'http://127.0.0.1:%d/onecall' % self.server_address[1]
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        status, headers, body = server.responses[0] if len(server.responses) == 1 else server.responses.pop(0)
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api(weather, monkeypatch):
+    server = StubAPI()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    monkeypatch.setattr(weather, 'BASE_URL', server.url, raising=False)
+    monkeypatch.setattr(weather, 'API_KEY', 'key', raising=False)
+    monkeypatch.setattr(weather, 'UNITS', 'imperial', raising=False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def clock(weather, monkeypatch):
+    # weather.py's time.time(), moved on by hand
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(weather.time, 'time', lambda: now[0])
+    return now
+
+
+def fetch(weather, api, fields=None, ttl=600):
+    return weather.fetch_json(api.url, {'lat': 1, 'lon': 2}, 'onecall_test', ttl=ttl, fields=fields)
+
+
+def test_fresh_response_is_served_from_cache(weather, api, clock):
+    api.responses = [(200, {}, {'current': {'temp': 1}})]
+    assert fetch(weather, api) == ({'current': {'temp': 1}}, clock[0])
+    fetched = clock[0]
+    clock[0] += 599
+    assert fetch(weather, api) == ({'current': {'temp': 1}}, fetched)
+    assert len(api.requests) == 1
+    # Expired after the TTL
+    clock[0] += 1
+    api.responses = [(200, {}, {'current': {'temp': 2}})]
+    assert fetch(weather, api) == ({'current': {'temp': 2}}, clock[0])
+    assert len(api.requests) == 2
+
+
+def test_etag_revalidation(weather, api, clock):
+    api.responses = [(200, {'ETag': '"v1"', 'Last-Modified': 'Tue, 14 Nov 2023 22:13:20 GMT'}, {'current': {'temp': 1}}),
+                     (304, {}, None)]
+    fetch(weather, api, ttl=0)
+    clock[0] += 1
+    assert fetch(weather, api, ttl=0) == ({'current': {'temp': 1}}, clock[0])
+    assert api.requests[1]['If-None-Match'] == '"v1"'
+    assert api.requests[1]['If-Modified-Since'] == 'Tue, 14 Nov 2023 22:13:20 GMT'
+    # The 304 keeps the validators for the next revalidation
+    clock[0] += 1
+    fetch(weather, api, ttl=0)
+    assert api.requests[2]['If-None-Match'] == '"v1"'
+
+
+def test_cache_control(weather, api, clock):
+    # max-age overrides the TTL ...
+    api.responses = [(200, {'Cache-Control': 'public, max-age=60'}, {'a': 1})]
+    fetch(weather, api, ttl=0)
+    clock[0] += 59
+    fetch(weather, api, ttl=0)
+    assert len(api.requests) == 1
+    # ... no-cache stores the response but revalidates it every time ...
+    clock[0] += 1
+    api.responses = [(200, {'Cache-Control': 'no-cache', 'ETag': '"v2"'}, {'a': 2})]
+    fetch(weather, api)
+    assert fetch(weather, api) == ({'a': 2}, clock[0])
+    assert len(api.requests) == 3 and api.requests[2]['If-None-Match'] == '"v2"'
+    # ... and no-store leaves the cache as it was
+    api.responses = [(200, {'Cache-Control': 'no-store'}, {'a': 3})]
+    fetch(weather, api)
+    assert weather.response_cache.load('onecall_test')['data'] == {'a': 2}
+
+
+def test_changed_fields_invalidate_cache(weather, api, clock):
+    body = {'current': {'temp': 1, 'uvi': 2}, 'daily': [{'dt': 3, 'pop': 4}]}
+    api.responses = [(200, {'ETag': '"v1"'}, body)]
+    assert fetch(weather, api, fields={'current': {'temp': None}})[0] == {'current': {'temp': 1}}
+    # Other fields: fetched again in full, without the old validators
+    fields = {'current': {'uvi': None}, 'daily': [{'pop': None}]}
+    assert fetch(weather, api, fields=fields)[0] == {'current': {'uvi': 2}, 'daily': [{'pop': 4}]}
+    assert len(api.requests) == 2 and 'If-None-Match' not in api.requests[1]
+    assert fetch(weather, api, fields=fields)[0] == {'current': {'uvi': 2}, 'daily': [{'pop': 4}]}
+    assert len(api.requests) == 2
+
+
+@pytest.fixture
+def sleeps(weather, monkeypatch):
+    delays = []
+    monkeypatch.setattr(weather.time, 'sleep', delays.append)
+    return delays
+
+
+def test_retries_with_backoff(weather, api, sleeps):
+    api.responses = [(503, {}, None), (500, {}, None), (200, {}, {'a': 1})]
+    assert weather.get_with_retries(api.url).json() == {'a': 1}
+    assert len(api.requests) == 3
+    assert len(sleeps) == 2
+    assert all(0 <= delay <= weather.RETRY_BACKOFF * 2 ** attempt for attempt, delay in enumerate(sleeps))
+
+
+def test_retry_after(weather, api, sleeps):
+    api.responses = [(429, {'Retry-After': '7'}, None), (429, {'Retry-After': '3600'}, None), (200, {}, {})]
+    weather.get_with_retries(api.url)
+    # Waits at least Retry-After, up to the longest backoff
+    assert 7 <= sleeps[0] <= weather.RETRY_BACKOFF * 2 ** weather.FETCH_RETRIES
+    assert sleeps[1] == weather.RETRY_BACKOFF * 2 ** weather.FETCH_RETRIES
+
+
+def test_retries_give_up(weather, api, sleeps):
+    api.responses = [(503, {}, None)]
+    with pytest.raises(weather.requests.HTTPError):
+        weather.get_with_retries(api.url)
+    assert len(api.requests) == weather.FETCH_RETRIES + 1
+    # Other errors are not retried
+    api.responses = [(404, {}, None)]
+    assert weather.get_with_retries(api.url).status_code == 404
+    assert len(api.requests) == weather.FETCH_RETRIES + 2
+
+
+def test_connection_errors_are_retried(weather, api, sleeps):
+    url = api.url
+    api.shutdown()
+    api.server_close()
+    with pytest.raises(weather.requests.ConnectionError):
+        weather.get_with_retries(url)
+    assert len(sleeps) == weather.FETCH_RETRIES
+
+
+def test_circuit_breaker(weather, api, clock, sleeps, monkeypatch):
+    monkeypatch.setattr(weather, 'FETCH_RETRIES', 0)
+    api.responses = [(503, {}, None)]
+    for _ in range(weather.CIRCUIT_FAILURES):
+        with pytest.raises(weather.requests.HTTPError):
+            weather.get_with_retries(api.url)
+    # Open: no requests during the cooldown
+    with pytest.raises(weather.CircuitOpenError):
+        weather.get_with_retries(api.url)
+    assert len(api.requests) == weather.CIRCUIT_FAILURES
+    # Half open after it: one probe, and one failure opens it again
+    clock[0] += weather.CIRCUIT_COOLDOWN
+    with pytest.raises(weather.requests.HTTPError):
+        weather.get_with_retries(api.url)
+    with pytest.raises(weather.CircuitOpenError):
+        weather.get_with_retries(api.url)
+    assert len(api.requests) == weather.CIRCUIT_FAILURES + 1
+    # A successful probe closes it: the next failure is counted from 0
+    clock[0] += weather.CIRCUIT_COOLDOWN
+    api.responses = [(200, {}, {})]
+    weather.get_with_retries(api.url)
+    api.responses = [(503, {}, None)]
+    with pytest.raises(weather.requests.HTTPError):
+        weather.get_with_retries(api.url)
+    with pytest.raises(weather.requests.HTTPError):
+        weather.get_with_retries(api.url)
+    assert len(api.requests) == weather.CIRCUIT_FAILURES + 4
+
+
+def test_stale_fallback(weather, api, clock, sleeps, monkeypatch):
+    monkeypatch.setattr(weather, 'FETCH_RETRIES', 0)
+    site = weather.Site('Here', 1, 2)
+    api.responses = [(200, {}, {'current': {'temp': 61.5}, 'daily': [{'temp': {'max': 70, 'min': 40}}]})]
+    data, fetched = weather.fetch_weather_data(site)
+    context = weather.layout_context(weather.process_weather_data(data, fetched), site.name)
+    assert context['current'].temp == 61.5 and not context['stale']
+
+    # The API fails: the cached payload is shown with its age
+    clock[0] += 2 * 3600
+    api.responses = [(500, {}, None)]
+    assert weather.fetch_weather_data(site) == (data, fetched)
+    context = weather.layout_context(weather.process_weather_data(data, fetched), site.name)
+    assert context['stale'] and context['data_age'] == '2 h'
+    plan = weather.get_layout((site.epd.width, site.epd.height))
+    assert any(widget.condition == 'stale' and widget.content(context) == 'Data 2 h old'
+               for widget in plan.widgets)
+
+    # Up to STALE_MAX_AGE
+    clock[0] = fetched + weather.STALE_MAX_AGE + 1
+    with pytest.raises(weather.requests.HTTPError):
+        weather.fetch_weather_data(site)
+
+
+def test_background_matches_drawing_everything(weather):
+    # The cached background plus the dynamic widgets gives the same pixels
+    # as drawing every widget, also with the repo's kerned font
+    with open(weather.LAYOUT_FILE) as f:
+        spec = json.load(f)
+    w = [{'description': 'light rain', 'icon': '10d'}]
+    data = {'current': {'temp': 61.2, 'uvi': 3.5, 'sunrise': 1_700_000_000, 'sunset': 1_700_040_000, 'weather': w},
+            'minutely': [{'precipitation': i / 10} for i in range(60)],
+            'daily': [{'dt': 1_700_000_000 + 86400 * i, 'temp': {'max': 70, 'min': 41}, 'pop': 0.3, 'weather': w}
+                      for i in range(8)]}
+    context = weather.layout_context(weather.process_weather_data(data), 'Here')
+    plan, flat = weather.RenderPlan(spec, (800, 480)), weather.RenderPlan(spec, (800, 480))
+    for widget in flat.widgets:
+        widget.flatten()
+    flat.key = 'flat'  # not the background cached for `plan`
+    weather.icons.require(plan.icon_sizes)
+    assert any(widget.static for widget in plan.widgets)
+    assert plan.render(context).tobytes() == flat.render(context).tobytes()
+
+
+@pytest.mark.parametrize('scale', ['linear', 'log', 'range', 'thresholds'])
+def test_bars_without_numpy(weather, monkeypatch, scale):
+    # NumPy rasterises all bars as one mask, with the same pixels as a
+    # rectangle per bar
+    layout = weather.RenderPlan({'size': [200, 100], 'widgets': []}, (200, 100))
+    spec = {'type': 'bars', 'values': 'minutely', 'box': [0, 0, 150, 100], 'bar_width': 3, 'gap': 1,
+            'bar_height': 90, 'scale': scale, 'thresholds': [0.1, 2.5, 7.6]}
+    context = {'minutely': [(i % 17) * 0.7 for i in range(60)]}
+    images = []
+    for module in (weather.numpy, None):
+        monkeypatch.setattr(weather, 'numpy', module)
+        widget = weather.BarsWidget(spec, layout)
+        image = weather.Image.new('1', layout.size, 255)
+        widget.draw(image, weather.ImageDraw.Draw(image), widget.content(context))
+        images.append(image.tobytes())
+    assert images[0] == images[1] != weather.Image.new('1', layout.size, 255).tobytes()
@@ -1,29 +1,110 @@
 import os
 import sys
+import time
+import json
+import math
+import bisect
+import re
+import string
+import hashlib
+import random
+import struct
+import argparse
+import threading
+import multiprocessing
 import logging
 from logging.handlers import RotatingFileHandler
+from array import array
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image, ImageDraw, ImageFont
 import requests
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Automatically add the 'lib' directory
 script_dir = os.path.dirname(os.path.abspath(__file__))
 lib_path = os.path.join(script_dir, 'lib')
 sys.path.append(lib_path)
-from waveshare_epd import epd7in5_V2
+import waveshare_epd
+from waveshare_epd import epdbuffer, epddiff
 
 # User defined configuration
-
+EPD_MODEL = 'epd7in5_V2'  # driver module name, see waveshare_epd.PANELS
+UPDATE_INTERVAL = 15 * 60  # seconds between updates in --daemon mode
+PARTIAL_REFRESH_MAX_AREA = 0.25  # use partial refreshes when less than this share of the screen changed
+MAX_PARTIAL_REFRESHES = 8  # full refresh after this many partial refreshes in a row
+FULL_CLEAR_HOURS = 24  # clear the screen before a full refresh at most this often, against ghosting
+CACHE_TTL = 10 * 60  # seconds a weather response is reused without asking the API again
+HTTP_TIMEOUT = (5, 20)  # connect and read timeouts in seconds
+FETCH_RETRIES = 3  # retries of a failed request, with jittered exponential backoff
+RETRY_BACKOFF = 2  # seconds; retry n waits up to RETRY_BACKOFF * 2**n
+CIRCUIT_FAILURES = 3  # failed fetches in a row before the API is left alone ...
+CIRCUIT_COOLDOWN = 30 * 60  # ... for this many seconds
+STALE_MAX_AGE = 12 * 3600  # show cached data up to this old when the API can't be reached
+STALE_NOTICE_AFTER = 30 * 60  # show the data's age on screen once it is this old
+# Several sites: dicts with 'name', 'lat', 'lon' and optionally 'model'
+# (default EPD_MODEL). There is one panel per model, so sites with the same
+# model take turns on it. When empty, LOCATION, LATITUDE and LONGITUDE are
+# used.
+LOCATIONS = []
+FETCH_WORKERS = 4  # sites fetched at the same time
+RENDER_WORKERS = None  # processes rendering sites, None for one per CPU core
 
 BASE_URL = f'https://api.openweathermap.org/data/3.0/onecall'
 FONT_DIR = os.path.join(os.path.dirname(__file__), 'font')
 PIC_DIR = os.path.join(os.path.dirname(__file__), 'pic')
 ICON_DIR = os.path.join(PIC_DIR, 'icon')
+# Last frame sent to the panel and refresh bookkeeping, kept between runs
+FRAME_FILE = os.path.join(script_dir, 'last_frame.bin')
+STATE_FILE = os.path.join(script_dir, 'display_state.json')
+# API responses with their expiry and validators, one file per location
+CACHE_DIR = os.path.join(script_dir, 'cache')
+# All icons, converted and resized for the layout, rebuilt when a PNG changes
+ICON_CACHE = os.path.join(script_dir, 'icon_cache.bin')
+# Widgets on the display, see layout.json
+LAYOUT_FILE = os.path.join(script_dir, 'layout.json')
+
+# Display drivers by model; a panel is only initialised when an image is
+# displayed on it
+panels = {}
+
+def get_panel(model):
+    if model not in panels:
+        panels[model] = waveshare_epd.get_epd(model)
+    return panels[model]
+
+class Site:
+    # A location and the panel showing it. `suffix` tells apart the files
+    # that record what each panel shows when there are several panels;
+    # sites on the same panel share them, so each diff starts from the
+    # frame the panel really shows.
+    def __init__(self, name, lat, lon, model=None, suffix=''):
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.model = model or EPD_MODEL
+        self.epd = get_panel(self.model)
+        self.frame_file = '{0}{2}{1}'.format(*os.path.splitext(FRAME_FILE), suffix)
+        self.state_file = '{0}{2}{1}'.format(*os.path.splitext(STATE_FILE), suffix)
 
-# Initialize display
-epd = epd7in5_V2.EPD()
-epd.init()
-epd.Clear()
+def configured_sites():
+    if not LOCATIONS:
+        return [Site(LOCATION, LATITUDE, LONGITUDE)]
+    return [Site(location['name'], location['lat'], location['lon'], location.get('model'),
+                 f"_{location.get('model') or EPD_MODEL}")
+            for location in LOCATIONS]
+
+# Reused for every request so a daemon keeps its connection to the API open;
+# the pool holds a connection for each fetch thread
+session = requests.Session()
+session.headers.update({'Accept-Encoding': 'gzip, deflate', 'User-Agent': 'e_paper_weather_display'})
+session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=FETCH_WORKERS))
 
 # Logging configuration
 LOG_FILE = 'weather_display.log'
@@ -37,175 +118,1231 @@ console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(
 logger.addHandler(console_handler)
 logger.info("Weather display script started.")
 
-# Font definitions
-font18 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 18)
-font22 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 22)
-font24 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 24)
-font30 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 30)
-font40 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 40)
-font50 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 50)
-font100 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 100)
-font120 = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 100) #slightly smaller
-font_small = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 24)
-font_tiny = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 14)
-font_forecast_temps = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 24)
-font_location = ImageFont.truetype(os.path.join(FONT_DIR, 'Font.ttc'), 20)
-
 COLORS = {'black': 'rgb(0,0,0)', 'white': 'rgb(255,255,255)', 'grey': 'rgb(235,235,235)'}
 
-# Fetch weather data
-def fetch_weather_data():
-    url = f"{BASE_URL}?lat={LATITUDE}&lon={LONGITUDE}&units={UNITS}&appid={API_KEY}"
-    try:
-        response = requests.get(url)
+# Fonts and rendered text
+FONT_FILE = os.path.join(FONT_DIR, 'Font.ttc')
+TEXT_CACHE_SIZE = 512  # rendered strings kept by FontCache
+DAY_NAMES = [datetime(2024, 1, day).strftime('%a') for day in range(1, 8)]
+
+class FontCache:
+    # Fonts are loaded on first use and shared per (path, size, index).
+    # Rendered strings are kept as masks and pasted, which is pixel-identical
+    # to draw.text() on a '1' image and much cheaper for text that repeats
+    # between updates (labels, day names, sunrise/sunset, high/low).
+    def __init__(self, path=FONT_FILE):
+        self.path = path
+        self.fonts = {}
+        self.texts = {}
+        self.font_hits = self.font_misses = 0
+        self.text_hits = self.text_misses = 0
+
+    def get(self, size, path=None, index=0):
+        key = (path or self.path, size, index)
+        font = self.fonts.get(key)
+        if font is None:
+            self.font_misses += 1
+            font = self.fonts[key] = ImageFont.truetype(key[0], size, index=index)
+        else:
+            self.font_hits += 1
+        return font
+
+    def render(self, text, size, anchor=None, start=0.0):
+        # Mask of `text` and its offset from the anchor point. `start` moves
+        # the text right by a fraction of a pixel, like a fractional x does
+        # in draw.text().
+        key = (size, text, anchor, start)
+        entry = self.texts.get(key)
+        if entry is not None:
+            self.text_hits += 1
+            return entry
+        self.text_misses += 1
+        font = self.get(size)
+        left, top, right, bottom = font.getbbox(text, mode='1', anchor=anchor)
+        if start:
+            # The fraction can push the text one pixel further right, and
+            # draw.text() only keeps it for a non-negative x
+            left, right = min(left, 0), right + 1
+        mask = Image.new('1', (max(right - left, 1), max(bottom - top, 1)), 0)
+        ImageDraw.Draw(mask).text((start - left, -top), text, font=font, fill=1, anchor=anchor)
+        if len(self.texts) >= TEXT_CACHE_SIZE:
+            del self.texts[next(iter(self.texts))]
+        entry = self.texts[key] = (mask, left, top)
+        return entry
+
+    def draw_text(self, image, xy, text, size, anchor=None, fill=COLORS['black']):
+        x = math.floor(xy[0])
+        mask, left, top = self.render(text, size, anchor, xy[0] - x)
+        image.paste(fill, (x + left, xy[1] + top), mask)
+
+    def prerender(self, size, texts, anchor=None):
+        for text in texts:
+            self.render(text, size, anchor)
+
+    def stats(self):
+        return (f"fonts {len(self.fonts)} loaded, {self.font_hits} hits; "
+                f"text {self.text_hits} hits, {self.text_misses} renders")
+
+class IconAtlas:
+    # Every icon in ICON_DIR as a mode '1' image at each size the layouts
+    # use, built once and stored in ICON_CACHE: a length-prefixed JSON index
+    # followed by the packed bits of all icons. The cache is rebuilt when the
+    # PNGs' names or mtimes (or the sizes) change, so updates decode no PNG
+    # at all.
+    VERSION = 2
+
+    def __init__(self, icon_dir=ICON_DIR, cache_file=ICON_CACHE, sizes=()):
+        self.icon_dir = icon_dir
+        self.cache_file = cache_file
+        self.sizes = sorted(set(map(tuple, sizes)))
+        self.icons = None
+
+    def require(self, sizes):
+        # Adds the (width, height) sizes a layout needs; new ones rebuild the
+        # atlas on next use
+        sizes = sorted(set(self.sizes) | set(map(tuple, sizes)))
+        if sizes != self.sizes:
+            self.sizes = sizes
+            self.icons = None
+
+    def get(self, icon_code, size):
+        if self.icons is None:
+            self.load()
+        return self.icons.get((icon_code, tuple(size)))
+
+    def signature(self):
+        try:
+            files = sorted((entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(self.icon_dir)
+                           if entry.name.endswith('.png'))
+        except OSError:
+            files = []
+        return {'version': self.VERSION, 'sizes': self.sizes, 'files': files}
+
+    def load(self):
+        signature = json.loads(json.dumps(self.signature()))
+        self.icons = self.read_cache(signature)
+        if self.icons is None:
+            self.icons = self.build()
+            self.write_cache(signature)
+
+    def build(self):
+        icons = {}
+        for name in os.listdir(self.icon_dir) if os.path.isdir(self.icon_dir) else []:
+            if not name.endswith('.png'):
+                continue
+            with Image.open(os.path.join(self.icon_dir, name)) as source:
+                source.load()
+                for size in self.sizes:
+                    if size == source.size:
+                        # Same conversion paste() applied to the PNG before
+                        icon = source.convert('1')
+                    else:
+                        # Area-filtered downscale, then a plain threshold:
+                        # dithering a 42 px icon only adds noise
+                        icon = source.convert('L').resize(size, Image.LANCZOS)
+                        icon = icon.convert('1', dither=Image.NONE)
+                    icons[(name[:-4], size)] = icon
+        logging.info(f"Built icon atlas with {len(icons)} icons.")
+        return icons
+
+    def read_cache(self, signature):
+        try:
+            with open(self.cache_file, 'rb') as f:
+                data = f.read()
+            (index_length,) = struct.unpack_from('<I', data)
+            index = json.loads(data[4:4 + index_length])
+            if index['signature'] != signature:
+                return None
+            icons = {}
+            offset = 4 + index_length
+            for code, size, width, height, length in index['icons']:
+                icons[(code, tuple(size))] = Image.frombytes(
+                    '1', (width, height), data[offset:offset + length])
+                offset += length
+            return icons
+        except (OSError, ValueError, KeyError, struct.error):
+            return None
+
+    def write_cache(self, signature):
+        entries, chunks = [], []
+        for (code, size), icon in self.icons.items():
+            bits = icon.tobytes()
+            entries.append([code, size, icon.width, icon.height, len(bits)])
+            chunks.append(bits)
+        index = json.dumps({'signature': signature, 'icons': entries}).encode()
+        try:
+            # Render workers may build the atlas at the same time
+            temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(struct.pack('<I', len(index)) + index + b''.join(chunks))
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            logging.warning(f"Could not save icon cache: {e}")
+
+fonts = FontCache()
+icons = IconAtlas()
+
+class ResponseCache:
+    # One JSON file per request key: the decoded payload, when it was
+    # fetched, when it expires and the ETag/Last-Modified validators
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, key):
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, entry):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write and rename, so a crash never leaves half a file behind
+            with open(self.path(key) + '.tmp', 'w') as f:
+                json.dump(entry, f)
+            os.replace(self.path(key) + '.tmp', self.path(key))
+        except OSError as e:
+            logging.warning(f"Could not save response cache: {e}")
+
+response_cache = ResponseCache()
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+class CircuitBreaker:
+    # After `threshold` failed fetches in a row the API is not called for
+    # `cooldown` seconds; one failure after that opens it again. The state
+    # is a file, so runs started by cron share it.
+    def __init__(self, path, threshold=CIRCUIT_FAILURES, cooldown=CIRCUIT_COOLDOWN):
+        self.path = path
+        self.threshold = threshold
+        self.cooldown = cooldown
+        # Sites are fetched in parallel threads
+        self.lock = threading.Lock()
+
+    def state(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'failures': 0, 'open_until': 0}
+
+    def save(self, state):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(state, f)
+        except OSError as e:
+            logging.warning(f"Could not save circuit breaker state: {e}")
+
+    def allow(self):
+        return time.time() >= self.state().get('open_until', 0)
+
+    def success(self):
+        with self.lock:
+            if self.state().get('failures'):
+                self.save({'failures': 0, 'open_until': 0})
+
+    def failure(self):
+        with self.lock:
+            state = self.state()
+            state['failures'] = state.get('failures', 0) + 1
+            if state['failures'] >= self.threshold:
+                state['open_until'] = time.time() + self.cooldown
+                logging.warning(f"{state['failures']} failed fetches in a row, pausing API calls for {self.cooldown} s.")
+            self.save(state)
+
+circuit = CircuitBreaker(os.path.join(CACHE_DIR, 'circuit.json'))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# session.get() with retries on connection errors, timeouts and overload
+# answers, waiting a random time up to RETRY_BACKOFF * 2**attempt (or the
+# server's Retry-After) in between. Other answers, 4xx included, are
+# returned as they are.
+def get_with_retries(url, **kwargs):
+    if not circuit.allow():
+        raise CircuitOpenError("API calls paused after repeated failures")
+    for attempt in range(FETCH_RETRIES + 1):
+        try:
+            response = session.get(url, **kwargs)
+            if response.status_code not in RETRY_STATUSES:
+                circuit.success()
+                return response
+            error = requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+            retry_after = response.headers.get('Retry-After', '')
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error, retry_after = e, ''
+        if attempt < FETCH_RETRIES:
+            delay = random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+            if retry_after.isdigit():
+                delay = max(delay, min(int(retry_after), RETRY_BACKOFF * 2 ** FETCH_RETRIES))
+            logging.warning(f"Fetch failed ({type(error).__name__}), retry {attempt + 1}/{FETCH_RETRIES} in {delay:.1f} s.")
+            time.sleep(delay)
+    circuit.failure()
+    raise error
+
+# Cache-Control directives of a response as {name: value or None}
+def cache_control(response):
+    directives = {}
+    for part in response.headers.get('Cache-Control', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+# One Call fields the display uses are worked out from the layout (see
+# RenderPlan.fields and onecall_fields()). {key: spec} keeps only those keys
+# of an object, [spec] applies spec to every element of a list, None keeps
+# the value as it is. Top-level sections not listed are excluded from the
+# request.
+ONECALL_SECTIONS = ('current', 'minutely', 'hourly', 'daily', 'alerts')
+
+# The part of `value` selected by `spec`; a spec of None keeps everything
+def project(value, spec):
+    if isinstance(spec, dict) and isinstance(value, dict):
+        return {key: project(value[key], spec[key]) for key in spec if key in value}
+    if isinstance(spec, list) and isinstance(value, list):
+        return [project(item, spec[0]) for item in value]
+    return value
+
+# GET `url` as JSON through the response cache, returning (data, time it
+# was fetched). A fresh cached copy is returned without network I/O; a stale
+# one is revalidated with its ETag or Last-Modified date, and a 304 answer
+# reuses it. With `fields` only those fields (see project()) are kept, in
+# the result and in the cache.
+def fetch_json(url, params, key, ttl=CACHE_TTL, fields=None):
+    now = time.time()
+    entry = response_cache.load(key)
+    if entry and entry.get('fields') != fields:
+        entry = None
+    if entry and now < entry.get('expires', 0):
+        logging.info(f"Using cached response for {key} ({now - entry['fetched']:.0f} s old).")
+        return entry['data'], entry['fetched']
+
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    response = get_with_retries(url, params=params, headers=headers, timeout=HTTP_TIMEOUT)
+    if response.status_code == 304 and entry:
+        logging.info(f"Cached response for {key} is still valid.")
+        data = entry['data']
+    else:
         response.raise_for_status()
-        return response.json()
+        data = project(response.json(), fields)
+
+    directives = cache_control(response)
+    if 'no-store' not in directives:
+        if 'no-cache' in directives:
+            max_age = 0
+        elif (directives.get('max-age') or '').isdigit():
+            max_age = int(directives['max-age'])
+        else:
+            max_age = ttl
+        response_cache.store(key, {
+            'fetched': now,
+            'expires': now + max_age,
+            'etag': response.headers.get('ETag') or (entry or {}).get('etag'),
+            'last_modified': response.headers.get('Last-Modified') or (entry or {}).get('last_modified'),
+            'fields': fields,
+            'data': data,
+        })
+    return data, now
+
+# Fetch weather data for `site`: (One Call payload, time it was fetched),
+# with the fields its panel's layout shows. When the API can't be reached
+# the last cached payload is used, up to STALE_MAX_AGE old.
+def fetch_weather_data(site):
+    fields = get_layout((site.epd.width, site.epd.height)).fields
+    params = {'lat': site.lat, 'lon': site.lon, 'units': UNITS, 'appid': API_KEY,
+              'exclude': ','.join(section for section in ONECALL_SECTIONS if section not in fields)}
+    key = f"onecall_{site.lat}_{site.lon}_{UNITS}"
+    try:
+        return fetch_json(BASE_URL, params, key, fields=fields)
     except requests.RequestException as e:
+        entry = response_cache.load(key)
+        if entry and time.time() - entry['fetched'] <= STALE_MAX_AGE:
+            logging.warning(f"Failed to fetch weather data ({e}), using data from "
+                            f"{datetime.fromtimestamp(entry['fetched']).strftime('%I:%M %p')}.")
+            return entry['data'], entry['fetched']
         logging.error(f"Failed to fetch weather data: {e}")
         raise
 
-def process_weather_data(data):
-    try:
-        current = data['current']
-        daily = data['daily']
-        minutely = data.get('minutely', [])
-
-        weather_data = {
-            "temp_current": current['temp'],
-            "report": current['weather'][0]['description'].title(),
-            "icon_code": current['weather'][0]['icon'],
-            "temp_max": daily[0]['temp']['max'],
-            "temp_min": daily[0]['temp']['min'],
-            "precip_percent": daily[0]['pop'] * 100,
-            "minutely_precipitation": [minute['precipitation'] for minute in minutely] if minutely else [],
-            "daily_forecast": [],
-            "sunrise": current['sunrise'],
-            "sunset": current['sunset'],
-            "uvi": current['uvi'],
-        }
-        for day_data in daily[:6]:  # Get the first 6 days
-            forecast_entry = {
-                "date": datetime.fromtimestamp(day_data['dt']).strftime('%a'),
-                "temp_max": day_data['temp']['max'],
-                "temp_min": day_data['temp']['min'],
-                "icon_code": day_data['weather'][0]['icon'],
-                "description": day_data['weather'][0]['description'].title()
-            }
-            weather_data["daily_forecast"].append(forecast_entry)
-        return weather_data
-    except KeyError as e:
-        logging.error(f"Error processing weather data: {e}")
-        raise
+# Weather data model. Records keep the raw values in slots; text derived
+# from them (titles, day names, times) is formatted on first use and kept.
+# A snapshot packs to a compact binary form for caching and comparing.
+class memoized:
+    # functools.cached_property for classes with __slots__: the value is
+    # kept in the slot named '_' + the property name
+    def __init__(self, func):
+        self.func = func
+        self.slot = '_' + func.__name__
+
+    def __get__(self, record, owner=None):
+        if record is None:
+            return self
+        try:
+            return getattr(record, self.slot)
+        except AttributeError:
+            value = self.func(record)
+            setattr(record, self.slot, value)
+            return value
+
+class Record:
+    # Packed as NUMBERS (the NUMBER_FIELDS) followed by each of TEXT_FIELDS
+    # as UTF-8 with a 2-byte length. SOURCES gives the One Call path of each
+    # field (keys and list indexes, from the section item for records of a
+    # SECTION list, from the payload otherwise) and DERIVED the field each
+    # memoized property is formatted from.
+    __slots__ = ()
+    NUMBER_FIELDS = ()
+    NUMBERS = struct.Struct('<')
+    TEXT_FIELDS = ()
+    TEXT_LENGTH = struct.Struct('<H')
+    SECTION = None
+    SOURCES = {}
+    DERIVED = {}
+
+    def pack(self):
+        parts = [self.NUMBERS.pack(*(getattr(self, name) for name in self.NUMBER_FIELDS))]
+        for name in self.TEXT_FIELDS:
+            text = getattr(self, name).encode()
+            parts += [self.TEXT_LENGTH.pack(len(text)), text]
+        return b''.join(parts)
+
+    # (record, offset after it) unpacked from `data` at `offset`
+    @classmethod
+    def unpack_from(cls, data, offset=0):
+        values = dict(zip(cls.NUMBER_FIELDS, cls.NUMBERS.unpack_from(data, offset)))
+        offset += cls.NUMBERS.size
+        for name in cls.TEXT_FIELDS:
+            length, = cls.TEXT_LENGTH.unpack_from(data, offset)
+            offset += cls.TEXT_LENGTH.size
+            values[name] = bytes(data[offset:offset + length]).decode()
+            offset += length
+        return cls(**values), offset
+
+    # The record of a One Call object. Fields the request left out (the
+    # layout doesn't show them) are 0 or ''.
+    @classmethod
+    def from_onecall(cls, value):
+        return cls(**{name: pick(value, path, '' if name in cls.TEXT_FIELDS else 0)
+                      for name, path in cls.SOURCES.items()})
+
+    # One Call paths from the payload behind `attribute`, all of the
+    # record's fields for None
+    @classmethod
+    def paths(cls, attribute=None):
+        attribute = cls.DERIVED.get(attribute, attribute)
+        names = cls.SOURCES if attribute is None else [attribute] if attribute in cls.SOURCES else []
+        prefix = (cls.SECTION, 0) if cls.SECTION else ()
+        return [prefix + cls.SOURCES[name] for name in names]
+
+# The value at `path` in a One Call payload, or `default` if it isn't there
+def pick(value, path, default):
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+    return value
+
+@dataclass
+class CurrentConditions(Record):
+    __slots__ = ('temp', 'temp_max', 'temp_min', 'pop', 'uvi', 'sunrise', 'sunset',
+                 'description', 'icon_code', '_report', '_precip_percent', '_sunrise_time', '_sunset_time')
+    NUMBER_FIELDS = ('temp', 'temp_max', 'temp_min', 'pop', 'uvi', 'sunrise', 'sunset')
+    NUMBERS = struct.Struct('<5d2q')
+    TEXT_FIELDS = ('description', 'icon_code')
+    SOURCES = {
+        'temp': ('current', 'temp'),
+        'temp_max': ('daily', 0, 'temp', 'max'),
+        'temp_min': ('daily', 0, 'temp', 'min'),
+        'pop': ('daily', 0, 'pop'),
+        'uvi': ('current', 'uvi'),
+        'sunrise': ('current', 'sunrise'),
+        'sunset': ('current', 'sunset'),
+        'description': ('current', 'weather', 0, 'description'),
+        'icon_code': ('current', 'weather', 0, 'icon'),
+    }
+    DERIVED = {'report': 'description', 'precip_percent': 'pop', 'sunrise_time': 'sunrise', 'sunset_time': 'sunset'}
+    temp: float
+    temp_max: float
+    temp_min: float
+    pop: float
+    uvi: float
+    sunrise: int
+    sunset: int
+    description: str
+    icon_code: str
+
+    @memoized
+    def report(self):
+        return self.description.title()
+
+    @memoized
+    def precip_percent(self):
+        return self.pop * 100
+
+    @memoized
+    def sunrise_time(self):
+        return datetime.fromtimestamp(self.sunrise).strftime('%I:%M %p')
+
+    @memoized
+    def sunset_time(self):
+        return datetime.fromtimestamp(self.sunset).strftime('%I:%M %p')
+
+@dataclass
+class DailyForecast(Record):
+    __slots__ = ('dt', 'temp_max', 'temp_min', 'pop', 'icon_code', 'description', '_day_name', '_report')
+    NUMBER_FIELDS = ('dt', 'temp_max', 'temp_min', 'pop')
+    NUMBERS = struct.Struct('<q3d')
+    TEXT_FIELDS = ('icon_code', 'description')
+    SECTION = 'daily'
+    SOURCES = {
+        'dt': ('dt',),
+        'temp_max': ('temp', 'max'),
+        'temp_min': ('temp', 'min'),
+        'pop': ('pop',),
+        'icon_code': ('weather', 0, 'icon'),
+        'description': ('weather', 0, 'description'),
+    }
+    DERIVED = {'day_name': 'dt', 'report': 'description'}
+    dt: int
+    temp_max: float
+    temp_min: float
+    pop: float
+    icon_code: str
+    description: str
+
+    @memoized
+    def day_name(self):
+        return datetime.fromtimestamp(self.dt).strftime('%a')
+
+    @memoized
+    def report(self):
+        return self.description.title()
+
+@dataclass
+class HourlyForecast(Record):
+    __slots__ = ('dt', 'temp', 'pop', 'icon_code', 'description', '_hour', '_report')
+    NUMBER_FIELDS = ('dt', 'temp', 'pop')
+    NUMBERS = struct.Struct('<q2d')
+    TEXT_FIELDS = ('icon_code', 'description')
+    SECTION = 'hourly'
+    SOURCES = {
+        'dt': ('dt',),
+        'temp': ('temp',),
+        'pop': ('pop',),
+        'icon_code': ('weather', 0, 'icon'),
+        'description': ('weather', 0, 'description'),
+    }
+    DERIVED = {'hour': 'dt', 'report': 'description'}
+    dt: int
+    temp: float
+    pop: float
+    icon_code: str
+    description: str
+
+    @memoized
+    def hour(self):
+        return datetime.fromtimestamp(self.dt).strftime('%I %p')
 
-# Generate display image
-def generate_display_image(weather_data):
+    @memoized
+    def report(self):
+        return self.description.title()
+
+@dataclass
+class WeatherSnapshot:
+    __slots__ = ('current', 'daily', 'hourly', 'minutely', 'fetched')
+    # fetched, number of days, hours and minutely values
+    HEADER = struct.Struct('<dBBH')
+    current: CurrentConditions
+    daily: tuple
+    hourly: tuple
+    minutely: array  # precipitation in mm/h, typecode 'f'
+    fetched: float
+
+    def to_bytes(self):
+        parts = [self.HEADER.pack(self.fetched, len(self.daily), len(self.hourly), len(self.minutely)),
+                 self.current.pack()]
+        parts += [day.pack() for day in self.daily]
+        parts += [hour.pack() for hour in self.hourly]
+        parts.append(self.minutely.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        fetched, days, hours, minutes = cls.HEADER.unpack_from(data)
+        current, offset = CurrentConditions.unpack_from(data, cls.HEADER.size)
+        daily = []
+        for _ in range(days):
+            day, offset = DailyForecast.unpack_from(data, offset)
+            daily.append(day)
+        hourly = []
+        for _ in range(hours):
+            hour, offset = HourlyForecast.unpack_from(data, offset)
+            hourly.append(hour)
+        minutely = array('f')
+        minutely.frombytes(data[offset:offset + minutes * minutely.itemsize])
+        return cls(current, tuple(daily), tuple(hourly), minutely, fetched)
+
+# Records of the snapshot by their name in the render context
+CONTEXT_RECORDS = {'current': CurrentConditions, 'daily': DailyForecast, 'hourly': HourlyForecast}
+MINUTELY_PATH = ('minutely', 0, 'precipitation')
+
+# The One Call fields (a spec for project()) behind the (context name,
+# attribute) pairs a layout reads, see RenderPlan.fields
+def onecall_fields(references):
+    paths = []
+    for name, attribute in references:
+        if name in CONTEXT_RECORDS:
+            paths += CONTEXT_RECORDS[name].paths(attribute)
+        elif name == 'minutely':
+            paths.append(MINUTELY_PATH)
+    return field_spec(paths) if paths else {}
+
+def field_spec(paths):
+    if any(not path for path in paths):
+        return None
+    if all(isinstance(path[0], int) for path in paths):
+        return [field_spec([path[1:] for path in paths])]
+    keys = {}
+    for path in paths:
+        keys.setdefault(path[0], []).append(path[1:])
+    return {key: field_spec(rest) for key, rest in keys.items()}
+
+def process_weather_data(data, fetched=None):
+    return WeatherSnapshot(
+        current=CurrentConditions.from_onecall(data),
+        daily=tuple(DailyForecast.from_onecall(day) for day in data.get('daily', [])[:6]),  # Get the first 6 days
+        hourly=tuple(HourlyForecast.from_onecall(hour) for hour in data.get('hourly', [])),
+        minutely=array('f', (pick(minute, MINUTELY_PATH[2:], 0) for minute in data.get('minutely', []))),
+        fetched=fetched or time.time(),
+    )
+
+# Layout: layout.json lists the widgets in the coordinates of its "size"
+# (the 800x480 design). RenderPlan compiles them for a panel's size once,
+# scaling every position, box, font and icon, and draws them each update.
+# Text values are str.format() templates over the render context
+# (layout_context()); a widget whose value can't be resolved (a missing
+# forecast day) or whose "if" key is false is left out. Only the One Call
+# sections and fields the widgets read are requested from the API.
+#
+# Widgets that only depend on STATIC_CONTEXT (dividers, the location,
+# text without fields) are drawn once into a background image, which is cached
+# in memory and in CACHE_DIR. Each update copies it and draws the rest.
+STATIC_CONTEXT = {'location'}
+
+# Context keys a str.format() template uses
+def template_keys(template):
+    return {name for name, _ in template_fields(template)}
+
+# (context key, first attribute or None) pairs a str.format() template
+# uses: ('daily', 'temp_max') for "{daily[0].temp_max:.0f}"
+def template_fields(template):
+    fields = set()
+    for _, field, _, _ in string.Formatter().parse(template):
+        if field is not None:
+            attribute = re.search(r'\.(\w+)', field)
+            fields.add((re.split(r'[.[]', field, 1)[0], attribute and attribute.group(1)))
+    return fields
+
+class Widget:
+    def __init__(self, spec, layout):
+        self.spec = spec
+        self.condition = spec.get('if')
+        # {name: (context list, index)} bound by "repeat" widgets
+        self.bindings = {}
+        x, y, width, height = spec['box']
+        # Area the widget draws in, in panel pixels: (x0, y0, x1, y1)
+        self.box = layout.point(x, y) + layout.point(x + width, y + height)
+        keys = template_keys(spec.get('value', '')) | {self.condition} - {None}
+        self.static = keys <= STATIC_CONTEXT
+
+    # Whether some of the widget goes into the background
+    def has_background(self):
+        return self.static
+
+    # Draw everything on each update instead
+    def flatten(self):
+        self.static = False
+
+    def draw_background(self, image, draw, context):
+        content = self.content(context)
+        if content is not None:
+            self.draw(image, draw, content)
+
+    # What the widget shows in `context`, None to leave it out
+    def content(self, context):
+        if self.condition and not context.get(self.condition):
+            return None
+        try:
+            return self.resolve(context)
+        except (KeyError, IndexError, AttributeError):
+            return None
+
+    def resolve(self, context):
+        return self.spec['value'].format_map(context)
+
+    def draw(self, image, draw, content):
+        raise NotImplementedError
+
+    # (context key, attribute or None) pairs the widget reads, with the
+    # names bound by "repeat" replaced by their list
+    def references(self):
+        fields = template_fields(self.spec.get('value', ''))
+        if self.condition:
+            fields.add((self.condition, None))
+        return {(self.bindings[name][0] if name in self.bindings else name, attribute)
+                for name, attribute in fields}
+
+class TextWidget(Widget):
+    # "anchor" is PIL's text anchor, applied to the matching point of the
+    # box: 'la' (the default) is its top left corner, 'mm' its centre
+    def __init__(self, spec, layout):
+        Widget.__init__(self, spec, layout)
+        self.size = layout.scaled(spec['size'])
+        self.anchor = spec.get('anchor')
+        horizontal, vertical = self.anchor or 'la'
+        x, y, width, height = spec['box']
+        x += {'l': 0, 'm': width / 2, 'r': width}[horizontal]
+        y += {'a': 0, 't': 0, 'm': height / 2, 's': height, 'b': height, 'd': height}[vertical]
+        self.xy = layout.point(x, y)
+
+    def draw(self, image, draw, content):
+        fonts.draw_text(image, self.xy, content, self.size, anchor=self.anchor)
+
+class IconWidget(Widget):
+    # Icon from ICON_DIR named by "value", scaled to the box
+    def __init__(self, spec, layout):
+        Widget.__init__(self, spec, layout)
+        self.size = (self.box[2] - self.box[0], self.box[3] - self.box[1])
+
+    def draw(self, image, draw, content):
+        icon = icons.get(content, self.size)
+        if icon:
+            image.paste(icon, self.box[:2])
+
+class BarsWidget(Widget):
+    # A bar chart of a number series: "values" names a context list
+    # ("minutely") or a field of each of its items ("daily.pop"). Bars are
+    # "bar_width" wide, "gap" apart, and stand on a baseline "bar_height"
+    # below the top of the box. "scale" turns values into heights:
+    #   linear      0 up to "max" (default: the largest value)
+    #   log         log(1 + value), 0 up to "max"
+    #   range       the smallest up to the largest value
+    #   thresholds  the share of "thresholds" (e.g. mm/h of light, moderate
+    #               and heavy rain) the value reaches
+    # With "labels", a time label ("format", "size", "offset" from the bar)
+    # goes under every "every"-th bar, counting "minutes" per bar from now.
+    # Heights are computed for the whole series at once, and with NumPy all
+    # bars are rasterised as one mask.
+    def __init__(self, spec, layout):
+        Widget.__init__(self, spec, layout)
+        self.static = False
+        self.values = spec['values']
+        self.scale = spec.get('scale', 'linear')
+        self.max = spec.get('max')
+        self.thresholds = sorted(spec.get('thresholds', []))
+        self.bar_width = max(1, round(spec['bar_width'] * layout.scale_x))
+        self.step = self.bar_width + round(spec['gap'] * layout.scale_x)
+        self.bar_height = round(spec['bar_height'] * layout.scale_y)
+        self.baseline = self.box[1] + self.bar_height
+        self.columns = {}
+        labels = spec.get('labels')
+        if labels:
+            self.label_every = labels['every']
+            self.label_minutes = labels.get('minutes', 1)
+            self.label_format = labels['format']
+            self.label_size = layout.scaled(labels['size'])
+            self.label_offset = layout.point(*labels['offset'])
+        else:
+            self.label_every = None
+
+    def references(self):
+        name, _, field = self.values.partition('.')
+        name = self.bindings[name][0] if name in self.bindings else name
+        return Widget.references(self) | {(name, field or None)}
+
+    def series(self, context):
+        name, _, field = self.values.partition('.')
+        items = context[name]
+        if field:
+            items = [getattr(item, field) for item in items]
+        return items
+
+    # Bar heights in pixels (a float64 array with NumPy, a list without),
+    # or None when there is nothing to show
+    def heights(self, values):
+        if not len(values):
+            return None
+        if numpy is not None:
+            values = numpy.asarray(values, dtype=numpy.float64)
+            low, high = values.min(), values.max()
+        else:
+            low, high = min(values), max(values)
+        if self.scale == 'thresholds':
+            if numpy is not None:
+                shares = numpy.searchsorted(self.thresholds, values, side='right')
+            else:
+                shares = [bisect.bisect_right(self.thresholds, value) for value in values]
+            top = len(self.thresholds) or 1
+        elif self.scale == 'range':
+            shares = values - low if numpy is not None else [value - low for value in values]
+            top = high - low or 1
+        else:
+            top = self.max or high
+            if top <= 0:
+                return None
+            shares = values
+            if self.scale == 'log':
+                shares = numpy.log1p(values) if numpy is not None else [math.log1p(value) for value in values]
+                top = math.log1p(top)
+        multiplier = self.bar_height / top
+        if numpy is not None:
+            return numpy.clip(shares * multiplier, 0, self.bar_height)
+        return list(max(min(share * multiplier, self.bar_height), 0) for share in shares)
+
+    def resolve(self, context):
+        values = self.series(context)
+        heights = self.heights(values)
+        if heights is None:
+            return None
+        labels = ()
+        if self.label_every:
+            now = context['now']
+            labels = tuple((now + timedelta(minutes=i * self.label_minutes)).strftime(self.label_format)
+                           for i in range(0, len(values), self.label_every))
+        return heights, labels
+
+    def draw(self, image, draw, content):
+        heights, labels = content
+        x0, _, x1, _ = self.box
+        if numpy is not None:
+            self.draw_bars(image, heights)
+        else:
+            for i, height in enumerate(heights):
+                x = x0 + i * self.step
+                if x > x1:
+                    break
+                draw.rectangle([(x, self.baseline - height), (min(x + self.bar_width, x1), self.baseline)],
+                               fill=COLORS['black'])
+        for i, label in enumerate(labels):
+            x = x0 + i * self.label_every * self.step
+            if x + self.label_offset[0] >= x1:
+                break  # Stop if labels run offscreen
+            fonts.draw_text(image, (x + self.label_offset[0], self.baseline + self.label_offset[1]),
+                            label, self.label_size)
+
+    def bar_columns(self, count, right):
+        # For `count` bars: the chart's columns that bars cover (relative to
+        # x0) and the bar covering each, kept per count
+        key = (count, right)
+        if key not in self.columns:
+            x0 = self.box[0]
+            columns = (numpy.arange(count) * self.step)[:, None] + numpy.arange(self.bar_width + 1)
+            bars = numpy.broadcast_to(numpy.arange(count)[:, None], columns.shape)
+            inside = columns <= right - x0
+            self.columns[key] = (columns[inside], bars[inside])
+        return self.columns[key]
+
+    def draw_bars(self, image, heights):
+        # The same pixels as a draw.rectangle() per bar: bar i covers columns
+        # x0 + i * step to + bar_width and rows from its truncated top down
+        # to the baseline, both ends included. The chart's region is cleared
+        # below each column's top in one array operation and pasted back.
+        x0, _, x1, _ = self.box
+        right = min(x1, image.width - 1)
+        columns, bars = self.bar_columns(len(heights), right)
+        if right < x0 or not len(columns):
+            return
+        tops = (self.baseline - heights).astype(numpy.int16)
+        top_of = numpy.full(right - x0 + 1, self.baseline + 1, dtype=numpy.int16)
+        if self.step > self.bar_width:
+            top_of[columns] = tops[bars]
+        else:
+            # Neighbouring bars share a column
+            numpy.minimum.at(top_of, columns, tops[bars])
+        ytop = int(top_of.min())
+        box = (x0, ytop, right + 1, self.baseline + 1)
+        rows = numpy.arange(ytop, self.baseline + 1, dtype=numpy.int16)[:, None]
+        white = numpy.asarray(image.crop(box)) & (rows < top_of)
+        region = Image.frombuffer('L', (white.shape[1], white.shape[0]), white.view(numpy.uint8) * 255, 'raw', 'L', 0, 1)
+        image.paste(region.convert('1', dither=Image.NONE), box)
+
+class DividerWidget(Widget):
+    # A line "from" one point "to" another, "width" pixels wide
+    def __init__(self, spec, layout):
+        x0, y0 = spec['from']
+        x1, y1 = spec['to']
+        Widget.__init__(self, dict(spec, box=[x0, y0, x1 - x0, y1 - y0]), layout)
+        self.width = layout.scaled(spec.get('width', 1))
+        self.line = [self.box[:2], self.box[2:]]
+        # The box covers the line's width too
+        half = (self.width + 1) // 2
+        self.box = (self.box[0] - half, self.box[1] - half, self.box[2] + half, self.box[3] + half)
+
+    def resolve(self, context):
+        return True
+
+    def draw(self, image, draw, content):
+        draw.line(self.line, fill=COLORS['black'], width=self.width)
+
+WIDGETS = {'text': TextWidget, 'icon': IconWidget, 'bars': BarsWidget, 'divider': DividerWidget}
+
+class RenderPlan:
+    def __init__(self, spec, size):
+        self.size = tuple(size)
+        design_width, design_height = spec['size']
+        self.scale_x = size[0] / design_width
+        self.scale_y = size[1] / design_height
+        self.widgets = []
+        self.compile(spec['widgets'], {})
+        self.icon_sizes = {widget.size for widget in self.widgets if isinstance(widget, IconWidget)}
+        # Black ink gives the same pixels in any order, but an icon replaces
+        # everything under its box: a static part can only go into the
+        # background when no dynamic icon drawn before it overlaps it
+        icon_boxes = []
+        for widget in self.widgets:
+            if widget.has_background() and any(self.overlap(widget.box, box) for box in icon_boxes):
+                widget.flatten()
+            if isinstance(widget, IconWidget) and not widget.static:
+                icon_boxes.append(widget.box)
+        self.key = hashlib.sha1(json.dumps([spec, self.size], sort_keys=True).encode()).hexdigest()
+        # One Call fields the widgets show, for fetch_weather_data()
+        self.fields = onecall_fields(set().union(*(widget.references() for widget in self.widgets)))
+        # Background images by the values of STATIC_CONTEXT
+        self.backgrounds = {}
+
+    def point(self, x, y):
+        return (round(x * self.scale_x), round(y * self.scale_y))
+
+    # A font size or line width, scaled by the smaller of the two scales
+    def scaled(self, size):
+        return max(1, round(size * min(self.scale_x, self.scale_y)))
+
+    def compile(self, specs, bindings):
+        # A "repeat" widget is expanded into "count" copies of its widgets,
+        # each moved by "step" and with "as" bound to the next item of the
+        # context's "items" list
+        for spec in specs:
+            if spec['type'] == 'repeat':
+                dx, dy = spec['step']
+                for i in range(spec['count']):
+                    copies = [dict(child, **{key: self.moved(child[key], dx * i, dy * i)
+                                             for key in ('box', 'from', 'to') if key in child})
+                              for child in spec['widgets']]
+                    self.compile(copies, dict(bindings, **{spec['as']: (spec['items'], i)}))
+            else:
+                widget = WIDGETS[spec['type']](spec, self)
+                widget.bindings = bindings
+                if bindings:
+                    # Shown only while the list has the item
+                    widget.flatten()
+                self.widgets.append(widget)
+
+    @staticmethod
+    def moved(coordinates, dx, dy):
+        return [coordinates[0] + dx, coordinates[1] + dy] + list(coordinates[2:])
+
+    @staticmethod
+    def overlap(a, b):
+        return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+    # Background files are named by the panel size and STATIC_CONTEXT
+    # values they are for, then by the layout, font and icons they were
+    # drawn from. Writing one removes the other versions for the same panel
+    # size and values.
+    def background(self, context):
+        static = tuple(context[name] for name in sorted(STATIC_CONTEXT))
+        image = self.backgrounds.get(static)
+        if image is None:
+            slot = hashlib.sha1(json.dumps([self.size, static]).encode()).hexdigest()[:16]
+            signature = json.dumps([self.key, static, os.stat(fonts.path).st_mtime_ns, icons.signature()['files']])
+            name = f"background_{slot}_{hashlib.sha1(signature.encode()).hexdigest()[:16]}.bin"
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                with open(path, 'rb') as f:
+                    image = Image.frombytes('1', self.size, f.read())
+            except (OSError, ValueError):
+                image = Image.new('1', self.size, 255)
+                draw = ImageDraw.Draw(image)
+                for widget in self.widgets:
+                    if widget.has_background():
+                        widget.draw_background(image, draw, context)
+                try:
+                    os.makedirs(CACHE_DIR, exist_ok=True)
+                    with open(f"{path}.{os.getpid()}.tmp", 'wb') as f:
+                        f.write(image.tobytes())
+                    os.replace(f"{path}.{os.getpid()}.tmp", path)
+                    for old in os.listdir(CACHE_DIR):
+                        if old.startswith(f"background_{slot}_") and old.endswith('.bin') and old != name:
+                            try:
+                                os.remove(os.path.join(CACHE_DIR, old))
+                            except FileNotFoundError:
+                                pass  # removed by another render worker
+                except OSError as e:
+                    logging.warning(f"Could not save background: {e}")
+            self.backgrounds[static] = image
+        return image
+
+    # The image for `context`. Only the dynamic widgets are drawn, on a copy
+    # of the background; display_frame() finds what changed on the panel
+    # from the packed frames.
+    def render(self, context):
+        image = self.background(context).copy()
+        draw = ImageDraw.Draw(image)
+        for widget in self.widgets:
+            if widget.static:
+                continue
+            widget_context = context
+            if widget.bindings:
+                try:
+                    widget_context = dict(context, **{name: context[items][i]
+                                                      for name, (items, i) in widget.bindings.items()})
+                except IndexError:
+                    continue
+            content = widget.content(widget_context)
+            if content is not None:
+                widget.draw(image, draw, content)
+        return image
+
+# Compiled layouts by panel size, recompiled when layout.json changes
+layouts = {}
+
+def get_layout(size):
+    mtime = os.stat(LAYOUT_FILE).st_mtime_ns
+    key = (tuple(size), mtime)
+    plan = layouts.get(key)
+    if plan is None:
+        with open(LAYOUT_FILE) as f:
+            plan = layouts[key] = RenderPlan(json.load(f), size)
+        icons.require(plan.icon_sizes)
+        logging.info(f"Compiled layout for {size[0]}x{size[1]}: {len(plan.widgets)} widgets.")
+    return plan
+
+# Values the layout's widgets can show
+def layout_context(weather_data, location):
+    data_age = time.time() - weather_data.fetched
+    return {
+        'current': weather_data.current,
+        'daily': weather_data.daily,
+        'hourly': weather_data.hourly,
+        'minutely': weather_data.minutely,
+        'location': location,
+        'now': datetime.now(),
+        'stale': data_age >= STALE_NOTICE_AFTER,
+        'data_age': f"{data_age / 3600:.0f} h" if data_age >= 2 * 3600 else f"{data_age / 60:.0f} min",
+    }
+
+# Generate display image for `location`, `size` pixels wide and high
+def generate_display_image(weather_data, location, size):
     try:
-        # Create a new blank image
-        template = Image.new('1', (epd.width, epd.height), 255)
-        draw = ImageDraw.Draw(template)
-
-        # --- Section Dividers ---
-        draw.line([(0, 190), (epd.width, 190)], fill=COLORS['black'], width=2)
-        draw.line([(220, 190), (220, epd.height)], fill=COLORS['black'], width=2)
-
-
-        icon_path = os.path.join(ICON_DIR, f"{weather_data['icon_code']}.png")
-        icon_image = Image.open(icon_path) if os.path.exists(icon_path) else None
-
-        if icon_image:
-            template.paste(icon_image, (15, 15))
-
-        # Current Temp (moved right, smaller)
-        draw.text((195, 30), f"{weather_data['temp_current']:.0f}°F", font=font120, fill=COLORS['black'])
-
-        # "Now" and "Precip" (moved further right)
-        draw.text((570, 80), f" {weather_data['report']}", font=font30, fill=COLORS['black'], anchor="mm")  # Further right
-        draw.text((570, 110), f"Precipitation: {weather_data['precip_percent']:.0f}%", font=font30, fill=COLORS['black'], anchor="mm")
-
-
-        # Rain forecast bars and timescale
-        if weather_data['minutely_precipitation']:
-            max_precipitation = max(weather_data['minutely_precipitation'])
-            if max_precipitation > 0:
-                bar_height_multiplier = 100 / max_precipitation
-                bar_width = 5
-                x_start = 345 - int(470 * 0.10)  # Adjusted for the forecast
-                y_start = 450
-                num_bars = len(weather_data['minutely_precipitation'])
-
-                for i, precip in enumerate(weather_data['minutely_precipitation']):
-                    bar_height = min(precip * bar_height_multiplier, 100)
-                    # Extend to x = 760
-                    draw.rectangle(
-                        [(x_start + i * (bar_width + 2), y_start - bar_height),
-                         (min(x_start + i * (bar_width + 2) + bar_width, 800), y_start)],  # Limit x to screen width
-                        fill=COLORS['black']
-                    )
-
-                now = datetime.now()
-                for i in range(0, num_bars, 15):
-                    time_label = (now + timedelta(minutes=i)).strftime('%I:%M')
-                    draw.text((x_start + i * (bar_width + 2) - 10, y_start + 5), time_label, font=font_tiny, fill=COLORS['black'])
-                    if (x_start + i * (bar_width + 2)) > 790:
-                        break  # Stop if labels run offscreen
-
-        # 6-Day Forecast Display (Moved Left)
-        x_offset = 345 - int(470 * 0.20)  # Start 40% further left
-        y_offset = 200
-        day_spacing = int(470 * 1.2 / 6)    # spacing across 6 days
-
-        for i, day_data in enumerate(weather_data['daily_forecast']):
-            draw.text((x_offset + i * day_spacing, y_offset), day_data['date'], font=font24, fill=COLORS['black'])
-            icon_forecast_path = os.path.join(ICON_DIR, f"{day_data['icon_code']}.png")
-            if os.path.exists(icon_forecast_path):
-                icon_forecast_image = Image.open(icon_forecast_path)
-                icon_forecast_image = icon_forecast_image.resize((int(32 * 1.33), int(32 * 1.33)))
-                template.paste(icon_forecast_image, (x_offset + i * day_spacing + 10, y_offset + 30))  # Adjusted position
-            draw.text((x_offset + i * day_spacing, y_offset + 80), f"{day_data['temp_max']:.0f}°/{day_data['temp_min']:.0f}°", font=font_forecast_temps, fill=COLORS['black'])
-
-
-        # Time updated
-        current_time = datetime.now().strftime('%I:%M %p')
-        draw.text((680, 10), current_time, font=font_small, fill=COLORS['black'])
-
-        # Bottom-left corner information
-        sunrise_time = datetime.fromtimestamp(weather_data['sunrise']).strftime('%I:%M %p')
-        sunset_time = datetime.fromtimestamp(weather_data['sunset']).strftime('%I:%M %p')
-        uvi_string = f"UV Index: {weather_data['uvi']}"
-
-        y_info = 200
-        draw.text((10, y_info), f"Sunrise: {sunrise_time}", font=font22, fill=COLORS['black'])
-        draw.text((10, y_info + 40), f"Sunset: {sunset_time}", font=font22, fill=COLORS['black'])
-        draw.text((10, y_info + 80), uvi_string, font=font22, fill=COLORS['black'])
-        draw.text((10, y_info + 120), LOCATION, font=font_location, fill=COLORS['black'])
-
-        # High/Low
-        draw.text((10, y_info + 160), f"High: {weather_data['temp_max']:.0f}°F", font=font40, fill=COLORS['black'])
-        draw.text((10, y_info + 200), f"Low: {weather_data['temp_min']:.0f}°F", font=font40, fill=COLORS['black'])
-
-        return template
+        image = get_layout(size).render(layout_context(weather_data, location))
+        return image
     except Exception as e:
         logging.error(f"Error generating display image: {e}")
         raise
 
-# Display image
-def display_image(image):
+# Frame last sent to each panel and its refresh state, by frame file, so
+# the daemon doesn't read them back from disk on every update
+displayed = {}
+
+# Frame currently on the panel of `site` and its refresh state, or
+# (None, {}) when unknown (first run, another panel model, unreadable files)
+def load_display_state(site):
+    if site.frame_file in displayed:
+        model, frame, state = displayed[site.frame_file]
+        if model == site.model:
+            return frame, dict(state)
+    try:
+        with open(site.state_file) as f:
+            state = json.load(f)
+        with open(site.frame_file, 'rb') as f:
+            frame = f.read()
+    except (OSError, ValueError):
+        return None, {}
+    if state.get('model') != site.model:
+        return None, {}
+    return frame, state
+
+def save_display_state(site, frame, state):
+    state['model'] = site.model
+    displayed[site.frame_file] = (site.model, frame, state)
     try:
-        epd.display(epd.getbuffer(image))
+        with open(site.frame_file, 'wb') as f:
+            f.write(frame)
+        with open(site.state_file, 'w') as f:
+            json.dump(state, f)
+    except OSError as e:
+        logging.warning(f"Could not save display state: {e}")
+
+# Display image on the panel of `site`
+def display_image(image, site):
+    display_frame(site.epd.getbuffer(image), site)
+
+# Send a frame packed by the panel's getbuffer() to it. The frame goes to
+# the diff, the driver and the frame file as it is, without copies.
+def display_frame(frame, site):
+    epd = site.epd
+    try:
+        if isinstance(frame, list):
+            frame = bytes(frame)
+        previous, state = load_display_state(site)
+        stride = epdbuffer.row_bytes(epd.width)
+        if epd.partial_refresh:
+            rects = epddiff.plan(previous, frame, stride, PARTIAL_REFRESH_MAX_AREA)
+        else:
+            # Only 1bpp frames are diffed; others are compared whole
+            rects = [] if frame == previous else None
+        if rects == []:
+            logging.info("Display unchanged, refresh skipped.")
+            return
+
+        partial_refreshes = state.get('partial_refreshes', 0)
+        # Partial refreshes (init_part + display_Partial with the window's
+        # bytes, as on the 7.5" V2) for small changes, a full one otherwise
+        if rects and partial_refreshes < MAX_PARTIAL_REFRESHES:
+            epd.init_part()
+            for xstart, ystart, xend, yend in rects:
+                epd.display_Partial(epdbuffer.window(frame, stride, xstart, ystart, xend, yend),
+                                    xstart * 8, ystart, xend * 8, yend)
+                logging.info(f"Partial refresh of {xend * 8 - xstart * 8}x{yend - ystart} at ({xstart * 8}, {ystart}).")
+            state['partial_refreshes'] = partial_refreshes + 1
+        else:
+            epd.init_full()
+            if time.time() - state.get('last_clear', 0) >= FULL_CLEAR_HOURS * 3600:
+                epd.clear()
+                state['last_clear'] = time.time()
+            epd.display_full(frame)
+            state['partial_refreshes'] = 0
+        epd.sleep()
+        save_display_state(site, frame, state)
         logging.info("Image displayed successfully.")
     except Exception as e:
         logging.error(f"Failed to display image: {e}")
         raise
 
+# One fetch, render and refresh cycle for a single site
+def update_site(site):
+    data, fetched = fetch_weather_data(site)
+    weather_data = process_weather_data(data, fetched)
+    image = generate_display_image(weather_data, site.name, (site.epd.width, site.epd.height))
+    display_image(image, site)
+
+# Runs in a render worker: a packed WeatherSnapshot in, the frame packed
+# for the panel (ready for display_frame) and the time it took out
+def render_site(snapshot, location, model):
+    started = time.monotonic()
+    epd = get_panel(model)
+    image = generate_display_image(WeatherSnapshot.from_bytes(snapshot), location, (epd.width, epd.height))
+    return bytes(epd.getbuffer(image)), time.monotonic() - started
+
+render_pool = None
+
+def get_render_pool():
+    # Forked after the fetch threads have finished, so workers start with
+    # the fonts, icons and layouts already loaded here. Kept for the daemon's next
+    # updates, unless a worker died.
+    global render_pool
+    if render_pool is None:
+        render_pool = ProcessPoolExecutor(RENDER_WORKERS, mp_context=multiprocessing.get_context('fork'))
+    return render_pool
+
+# Fetch all sites in threads sharing the session, render them in worker
+# processes and send each frame to its panel as soon as it is ready. The
+# panels share epdconfig's pins, so they are written one at a time.
+def update_sites(sites):
+    global render_pool
+    timings = {site: {} for site in sites}
+
+    def fetch(site):
+        started = time.monotonic()
+        data, fetched = fetch_weather_data(site)
+        snapshot = process_weather_data(data, fetched).to_bytes()
+        timings[site]['fetch'] = time.monotonic() - started
+        return snapshot
+
+    # Compiled here, before the fetch threads ask for the layouts' fields,
+    # and so a new render pool's workers start with the layouts. The drivers
+    # that pack the frames are loaded too (they never set up the panel's
+    # pins themselves).
+    for site in sites:
+        get_layout((site.epd.width, site.epd.height))
+        site.epd.driver()
+
+    snapshots = {}
+    with ThreadPoolExecutor(FETCH_WORKERS) as pool:
+        futures = {pool.submit(fetch, site): site for site in sites}
+        for future in as_completed(futures):
+            try:
+                snapshots[futures[future]] = future.result()
+            except Exception as e:
+                logging.error(f"Skipping {futures[future].name}: {e}")
+
+    pool = get_render_pool()
+    futures = {pool.submit(render_site, snapshot, site.name, site.model): site
+               for site, snapshot in snapshots.items()}
+    for future in as_completed(futures):
+        site = futures[future]
+        try:
+            frame, timings[site]['render'] = future.result()
+            started = time.monotonic()
+            display_frame(frame, site)
+            timings[site]['display'] = time.monotonic() - started
+        except BrokenProcessPool as e:
+            logging.error(f"Render worker died while rendering {site.name}: {e}")
+            render_pool = None
+        except Exception as e:
+            logging.error(f"Failed to update {site.name}: {e}")
+
+    for site in sites:
+        steps = ', '.join(f"{step} {seconds:.2f} s" for step, seconds in timings[site].items())
+        logging.info(f"{site.name}: {steps or 'not updated'}.")
+
+def update_display():
+    sites = configured_sites()
+    if len(sites) == 1:
+        update_site(sites[0])
+    else:
+        update_sites(sites)
+
 # Main function
 def main():
     try:
-        data = fetch_weather_data()
-        weather_data = process_weather_data(data)
-        image = generate_display_image(weather_data)
-        display_image(image)
+        update_display()
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}")
 
+# Daemon mode: fonts, icons, the HTTP session and the display driver stay
+# loaded, and the panel sleeps between updates
+def run_daemon(interval=UPDATE_INTERVAL):
+    logging.info(f"Daemon mode, updating every {interval} s.")
+    fonts.prerender(24, DAY_NAMES)
+    try:
+        while True:
+            started = time.monotonic()
+            cpu_started = time.process_time()
+            main()
+            logging.info(f"Update took {time.monotonic() - started:.2f} s ({time.process_time() - cpu_started:.2f} s CPU); {fonts.stats()}.")
+            # Wake on the wall-clock interval boundary, like */15 in cron
+            time.sleep(interval - time.time() % interval)
+    except KeyboardInterrupt:
+        logging.info("Daemon stopped.")
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Update the e-paper weather display.")
+    parser.add_argument('--daemon', action='store_true', help="keep running and update the display every --interval seconds")
+    parser.add_argument('--interval', type=int, default=UPDATE_INTERVAL, help=f"seconds between updates in daemon mode (default {UPDATE_INTERVAL})")
+    args = parser.parse_args()
+    if args.daemon:
+        run_daemon(args.interval)
+    else:
+        main()